@@ -58,6 +58,12 @@ class SimplePropertyDefinition(model_spec.PropertyDefinition):
     Definition of a property as a database model that does not require any special parameters
     """
 
+    # Properties the datastore does not index and so can not project
+    UNINDEXED_CLASS_NAMES = ("TextProperty", "BlobProperty")
+
+    def is_projectable(self):
+        return not self.db_class_name in SimplePropertyDefinition.UNINDEXED_CLASS_NAMES
+
     def get_property(self, field_name):
         return platform_manager.PlatformManager.get_instance().get_property_class(self.db_class_name, self.parameters)
 
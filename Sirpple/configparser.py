@@ -4,6 +4,103 @@ from glob import glob
 from os.path import normpath
 from os.path import join as joinpath
 import pyyaml
+from pyyaml.reader import Reader
+from pyyaml.scanner import Scanner
+from pyyaml.parser import Parser
+from pyyaml.composer import Composer
+from pyyaml.constructor import SafeConstructor
+from pyyaml.resolver import BaseResolver, Resolver
+
+# libyaml builds nodes from the yaml package it was installed with, so the C
+# loader is made from that package's constructor and resolver
+try:
+    import yaml
+    from yaml.cyaml import CParser
+except ImportError:
+    yaml = None
+
+# The only YAML tags configuration files may use
+CONFIG_TAGS = [
+    u'tag:yaml.org,2002:null',
+    u'tag:yaml.org,2002:bool',
+    u'tag:yaml.org,2002:int',
+    u'tag:yaml.org,2002:float',
+    u'tag:yaml.org,2002:str',
+    u'tag:yaml.org,2002:seq',
+    u'tag:yaml.org,2002:map'
+]
+
+# Implicitly resolved tags, the merge key is resolved so mappings can be merged
+CONFIG_IMPLICIT_TAGS = CONFIG_TAGS + [u'tag:yaml.org,2002:merge']
+
+def restrict_to_config_tags(constructor, resolver, safe_constructor, full_resolver):
+    """
+    Limits a constructor and resolver to the tags configuration files may use
+
+    @param constructor: The constructor class to register the allowed constructors on
+    @type constructor: Subclass of safe_constructor with an empty yaml_constructors
+    @param resolver: The resolver class to register the allowed implicit resolvers on
+    @type resolver: BaseResolver subclass with an empty yaml_implicit_resolvers
+    @param safe_constructor: The safe constructor of the same yaml package
+    @type safe_constructor: SafeConstructor class
+    @param full_resolver: The default resolver of the same yaml package
+    @type full_resolver: Resolver class
+    """
+    for tag in CONFIG_TAGS:
+        constructor.add_constructor(tag, safe_constructor.yaml_constructors[tag])
+    constructor.add_constructor(None, safe_constructor.construct_undefined)
+
+    for first, resolvers in full_resolver.yaml_implicit_resolvers.items():
+        for tag, regexp in resolvers:
+            if tag in CONFIG_IMPLICIT_TAGS:
+                resolver.add_implicit_resolver(tag, regexp, [first])
+
+class ConfigConstructor(SafeConstructor):
+    """ Safe constructor limited to the plain data configuration files need """
+
+    yaml_constructors = {}
+
+class ConfigResolver(BaseResolver):
+    """ Resolver that only recognizes the implicit scalar types configuration files need """
+
+    yaml_implicit_resolvers = {}
+
+restrict_to_config_tags(ConfigConstructor, ConfigResolver, SafeConstructor, Resolver)
+
+class ConfigLoader(Reader, Scanner, Parser, Composer, ConfigConstructor, ConfigResolver):
+    """ Pure Python pipeline for loading configuration files """
+
+    def __init__(self, stream):
+        Reader.__init__(self, stream)
+        Scanner.__init__(self)
+        Parser.__init__(self)
+        Composer.__init__(self)
+        ConfigConstructor.__init__(self)
+        ConfigResolver.__init__(self)
+
+if yaml != None:
+    class CConfigConstructor(yaml.constructor.SafeConstructor):
+        """ ConfigConstructor for the nodes of the yaml package libyaml was built with """
+
+        yaml_constructors = {}
+
+    class CConfigResolver(yaml.resolver.BaseResolver):
+        """ ConfigResolver for the nodes of the yaml package libyaml was built with """
+
+        yaml_implicit_resolvers = {}
+
+    restrict_to_config_tags(CConfigConstructor, CConfigResolver, yaml.constructor.SafeConstructor,
+        yaml.resolver.Resolver)
+
+    class CConfigLoader(CParser, CConfigConstructor, CConfigResolver):
+        """ Configuration file loader parsing with libyaml """
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            CConfigConstructor.__init__(self)
+            CConfigResolver.__init__(self)
+else:
+    CConfigLoader = None
 
 
 class ParserAdapter:
@@ -61,19 +158,28 @@ class ParserAdapter:
 class YamlAdapter(ParserAdapter):
     """ Adapts the pyyaml YAML parser to the generic parser """
 
-    def __init__(self):
+    def __init__(self, loader=None):
+        """
+        init a YAML parser
+
+        @keyword loader: The pyyaml loader class to use, defaults to the libyaml
+                         config loader when available and the pure Python one otherwise
+        @type loader: pyyaml Loader class
+        """
         ParserAdapter.__init__(self, extension='yaml')
+        self.loader = loader or CConfigLoader or ConfigLoader
     
     def loads(self, source):
         """
         Loads the data saved in the provided string
 
+        @note: Only plain data may be loaded, tags creating other objects raise an error
         @param source: The string to load form
         @type source: String
         @return: Dictionary loaded from string
         @rtype: Dictionary
         """
-        return pyyaml.load(source)
+        return pyyaml.load(source, Loader=self.loader)
 
 __parsers = {'yaml' : YamlAdapter()}
 
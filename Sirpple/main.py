@@ -3,6 +3,7 @@
 import webapp2
 import yamlmodels
 from page_builder import managers
+from rest import gae_controllers
 import re
 import testcontrollers
 
@@ -37,14 +38,41 @@ class TestHandler(webapp2.RequestHandler):
 class AppHandler(webapp2.RequestHandler):
 
     APP_TEMPLATE = "app.html"
+    GZIP_ETAG_SUFFIX = "-gzip"
 
     def get(self):
+        # In development ?prerender=0 serves the page as it was before prerendering
+        # so pageTiming.interactive can be compared between the two
+        prerender = not (managers.builders.PageBuilder.DEBUG and self.request.get('prerender') == '0')
+
         composite_template_manager = managers.PageManager.get_instance()
-        self.response.out.write(composite_template_manager.render(AppHandler.APP_TEMPLATE))
+        page = composite_template_manager.render_page(AppHandler.APP_TEMPLATE, prerender)
+
+        # Each encoding is a different representation so it gets its own ETag
+        use_gzip = bool(self.request.accept_encoding.quality('gzip'))
+        etag = page.get_etag()
+        if use_gzip:
+            etag += AppHandler.GZIP_ETAG_SUFFIX
+
+        self.response.headers['Content-Type'] = 'text/html; charset=utf-8'
+        self.response.headers['Cache-Control'] = 'no-cache'
+        self.response.headers['Vary'] = 'Accept-Encoding'
+        self.response.etag = etag
+
+        if etag in self.request.if_none_match:
+            self.response.status = 304
+            return
+
+        if use_gzip:
+            self.response.headers['Content-Encoding'] = 'gzip'
+            self.response.out.write(page.get_gzipped())
+        else:
+            self.response.out.write(page.get_contents())
 
 app = webapp2.WSGIApplication([('/', MainHandler),
                                 ('/test', TestHandler),
-                                ('/app', AppHandler)], debug=True)
+                                ('/app', AppHandler),
+                                ('/rest/batch', gae_controllers.GAEBatchController)], debug=True)
 
 
 if __name__ == '__main__':
@@ -13,9 +13,10 @@ class PageBuilder:
     rendering library. Also supports caching the results.
     """
 
-    DEBUG = True
+    # Watch template files for changes everywhere but production
+    DEBUG = os.environ.get("SERVER_SOFTWARE", "Development").startswith("Development")
 
-    def __init__(self, target, templates_dir, tag):
+    def __init__(self, target, templates_dir, tag, prerenderer=None):
         """
         Create a new page builder to operate on the given target page
 
@@ -26,50 +27,128 @@ class PageBuilder:
         @param tag: The tag to look for that indicates another template
                       should be loaded in its place.
         @param tag: String
+        @keyword prerenderer: Prepares sub-templates without includes of their own before they are loaded
+        @type prerenderer: EJSPrerenderer
         """
         self.__tag_replace_regex = re.compile("(?<=.)")
+        self.__target = target
         self.__templates_dir = templates_dir
         self.__tag = tag
         reg_ready_tag = self.__generate_reg_ready_tag(self.__tag)
         self.__tag_regex = re.compile(reg_ready_tag % "([\w\.\/]+)")
+        self.__prerenderer = prerenderer
         self.__cache = None
 
-        with open(self.__get_file_loc(target)) as f:
-            self.__target_contents = f.read()
+        # File names mapped to their modification time and tokenized contents
+        self.__files = {}
     
     def render(self):
         """
         Loads all of the sub-templates and returns this template pre-processed
-        
+
+        @note: Outside of DEBUG the result is built once and never checked again
         @return: The original template file contents with sub-templates loaded
         @rtype: String
         """
-        if self.__cache == None or PageBuilder.DEBUG:
-            for match in self.__tag_regex.finditer(self.__target_contents):
-                self.__target_contents = self.__replace_tag(self.__target_contents, match.group(1))
-            
-            self.__cache = self.__target_contents
+        if self.__cache != None and not PageBuilder.DEBUG:
+            return self.__cache
+
+        # Re-read only the files that changed since they were last read,
+        # following includes so nested sub-templates are watched too
+        changed = False
+        visited = set()
+        pending = [self.__target]
+        while pending:
+            filename = pending.pop()
+            if filename in visited:
+                continue
+            visited.add(filename)
+
+            changed = self.__refresh_file(filename) or changed
+            pending.extend(self.__get_includes(filename))
+
+        if changed or self.__cache == None:
+            self.__cache = self.__assemble()
         
         return self.__cache
-    
-    def __replace_tag(self, overall_contents, filename):
+
+    def __assemble(self):
         """
-        Replace the tag for the given subtemplate file
+        Combines the target template with its sub-templates, expanding nested includes
 
-        @param overall_contents: The string to find and replace the tags in
-        @type overall_contents: String
-        @param filename: The name of the file to load to replace its stubbed tag
-        @type filename: String
-        @return: Updated overall template contents
+        @return: The target template contents with sub-templates loaded
         @rtype: String
         """
+        output = []
+        self.__append_segments(self.__target, output, [])
+        return "".join(output)
+
+    def __append_segments(self, filename, output, include_stack):
+        """
+        Adds the literal segments of a template to output, expanding its includes in place
+
+        @param filename: The name of the loaded template to expand
+        @type filename: String
+        @param output: The list of strings being assembled
+        @type output: List of Strings
+        @param include_stack: The templates currently being expanded, outermost first
+        @type include_stack: List of Strings
+        """
+        if filename in include_stack:
+            raise ValueError("Template include cycle: " + " -> ".join(include_stack + [filename]))
+
+        include_stack.append(filename)
+
+        # Segments alternate between literal text and included template names
+        segments = self.__files[filename][1]
+        for i in range(0, len(segments)):
+            if i % 2 == 0:
+                output.append(segments[i])
+            else:
+                self.__append_segments(segments[i], output, include_stack)
+
+        include_stack.pop()
+
+    def __get_includes(self, filename):
+        """
+        Finds the names of the sub-templates the given template includes
+
+        @param filename: The name of the loaded template to look through
+        @type filename: String
+        @return: Names of included templates in the order they appear
+        @rtype: List of Strings
+        """
+        return self.__files[filename][1][1::2]
+
+    def __refresh_file(self, filename):
+        """
+        Reads and tokenizes the given template if it has not been read or changed since it was read
+
+        @param filename: The name of the template file
+        @type filename: String
+        @return: True if the file was read and False if the cached copy was current
+        @rtype: Boolean
+        """
         loc = self.__get_file_loc(filename)
-        target_tag = self.__tag % filename
+
+        if filename in self.__files:
+            if not PageBuilder.DEBUG:
+                return False
+            mtime = os.path.getmtime(loc)
+            if mtime == self.__files[filename][0]:
+                return False
+        else:
+            mtime = os.path.getmtime(loc)
 
         with open(loc) as f:
-            sub_template = f.read()
+            contents = f.read()
 
-        return overall_contents.replace(target_tag, sub_template)
+        # Splitting on the tag's capture group alternates literals and include names
+        segments = self.__tag_regex.split(contents)
+        if self.__prerenderer != None and filename != self.__target and len(segments) == 1:
+            segments = [self.__prerenderer.prerender(filename, contents)]
+        self.__files[filename] = (mtime, segments)
+        return True
 
     def __get_file_loc(self, target):
         """
@@ -0,0 +1,332 @@
+"""
+Build-time bundling of the scripts and stylesheets referenced by assembled pages
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+class AssetGroup:
+    """
+    A run of adjacent local script or stylesheet references in a page that can share a bundle
+    """
+
+    def __init__(self, asset_type, start, end, sources):
+        """
+        Create a new group of references
+
+        @param asset_type: The extension of the assets in the group (js or css)
+        @type asset_type: String
+        @param start: Index in the page where the first reference starts
+        @type start: int
+        @param end: Index in the page where the last reference ends
+        @type end: int
+        @param sources: Paths of the referenced files in page order
+        @type sources: List of Strings
+        """
+        self.asset_type = asset_type
+        self.start = start
+        self.end = end
+        self.sources = sources
+
+    def get_manifest_key(self):
+        """
+        Get the string identifying this group's sources in a bundle manifest
+
+        @return: Source paths joined in order
+        @rtype: String
+        """
+        return "|".join(self.sources)
+
+class AssetBundler:
+    """
+    Concatenates the local assets a page references into content-hashed bundles
+
+    Bundles are written once at build time along with a manifest. At runtime
+    the manifest is only read, so pages can be rewritten on a read only filesystem.
+    Each manifest entry records a hash of the sources it was built from and is
+    only used while the sources still match it.
+    """
+
+    DEFAULT_STATIC_ROOT = "."
+    DEFAULT_BUNDLE_DIR = "bundles"
+    DEFAULT_BUNDLE_URL = "/bundles"
+    MANIFEST_NAME = "manifest.json"
+    MANIFEST_BUNDLE = "bundle"
+    MANIFEST_DIGEST = "digest"
+
+    SCRIPT_REGEX = re.compile(r'<script\s+[^>]*?src="([^"]+)"[^>]*>\s*</script>', re.IGNORECASE)
+    STYLESHEET_REGEX = re.compile(r'<link\s+(?=[^>]*rel="stylesheet")[^>]*?href="([^"]+)"[^>]*/?>', re.IGNORECASE)
+
+    SCRIPT_TAG = '<script type="text/javascript" src="%s"></script>'
+    STYLESHEET_TAG = '<link rel="stylesheet" type="text/css" href="%s" />'
+
+    CSS_COMMENT_REGEX = re.compile(r"/\*.*?\*/", re.DOTALL)
+    CSS_WHITESPACE_REGEX = re.compile(r"\s+")
+    CSS_PUNCTUATION_REGEX = re.compile(r"\s*([{};,>])\s*")
+    CSS_URL_REGEX = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+
+    def __init__(self, static_root=DEFAULT_STATIC_ROOT, bundle_dir=DEFAULT_BUNDLE_DIR, bundle_url=DEFAULT_BUNDLE_URL):
+        """
+        Create a new bundler
+
+        @keyword static_root: Directory that static URLs are relative to
+        @type static_root: String
+        @keyword bundle_dir: Directory (relative to static_root) bundles are written to
+        @type bundle_dir: String
+        @keyword bundle_url: URL the bundle directory is served at
+        @type bundle_url: String
+        """
+        self.__static_root = static_root
+        self.__bundle_dir = bundle_dir
+        self.__bundle_url = bundle_url
+        self.__manifest = None
+
+    def build(self, page):
+        """
+        Writes bundles for every group of local assets in page and records them in the manifest
+
+        @param page: The assembled page to bundle the assets of
+        @type page: String
+        @return: The page with each group replaced by a reference to its bundle
+        @rtype: String
+        """
+        manifest = self.__load_manifest()
+        bundle_loc = os.path.join(self.__static_root, self.__bundle_dir)
+        if not os.path.isdir(bundle_loc):
+            os.makedirs(bundle_loc)
+
+        for group in self.find_groups(page):
+            sources = self.__read_sources(group)
+            contents = self.__concatenate(group, sources)
+            name = hashlib.sha1(contents).hexdigest()[:16] + "." + group.asset_type
+
+            with open(os.path.join(bundle_loc, name), "wb") as f:
+                f.write(contents)
+
+            manifest[group.get_manifest_key()] = {
+                AssetBundler.MANIFEST_BUNDLE : self.__bundle_url + "/" + name,
+                AssetBundler.MANIFEST_DIGEST : self.__get_digest(sources)
+            }
+
+        with open(os.path.join(bundle_loc, AssetBundler.MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+
+        return self.rewrite(page)
+
+    def rewrite(self, page):
+        """
+        Replaces groups of asset references that have been bundled with a single reference
+
+        @note: Groups without a bundle in the manifest, or whose sources changed since
+               it was built, are left as they are
+        @param page: The assembled page to rewrite
+        @type page: String
+        @return: The page referencing bundles where available
+        @rtype: String
+        """
+        manifest = self.__load_manifest()
+        if not manifest:
+            return page
+
+        output = []
+        last = 0
+        for group in self.find_groups(page):
+            bundle = self.__get_current_bundle(manifest, group)
+            if bundle == None:
+                continue
+
+            if group.asset_type == "js":
+                tag = AssetBundler.SCRIPT_TAG % bundle
+            else:
+                tag = AssetBundler.STYLESHEET_TAG % bundle
+
+            output.append(page[last:group.start])
+            output.append(tag)
+            last = group.end
+
+        output.append(page[last:])
+        return "".join(output)
+
+    def find_groups(self, page):
+        """
+        Finds runs of local asset references separated only by whitespace
+
+        @param page: The assembled page to look through
+        @type page: String
+        @return: Groups of references in the order they appear
+        @rtype: List of AssetGroups
+        """
+        matches = []
+        for asset_type, regex in (("js", AssetBundler.SCRIPT_REGEX), ("css", AssetBundler.STYLESHEET_REGEX)):
+            for match in regex.finditer(page):
+                if self.__is_local(match.group(1)):
+                    matches.append((match.start(), match.end(), asset_type, match.group(1)))
+        matches.sort()
+
+        groups = []
+        for start, end, asset_type, source in matches:
+            previous = groups[-1] if groups else None
+            if previous != None and previous.asset_type == asset_type and page[previous.end:start].strip() == "":
+                previous.end = end
+                previous.sources.append(source)
+            else:
+                groups.append(AssetGroup(asset_type, start, end, [source]))
+
+        return groups
+
+    def __get_current_bundle(self, manifest, group):
+        """
+        Gets the URL of the bundle built for a group if its sources have not changed since
+
+        @param manifest: The manifest of previously built bundles
+        @type manifest: Dictionary
+        @param group: The group to look up
+        @type group: AssetGroup
+        @return: URL of the bundle or None if there is no current bundle
+        @rtype: String
+        """
+        entry = manifest.get(group.get_manifest_key(), None)
+        if not isinstance(entry, dict):
+            return None
+
+        try:
+            digest = self.__get_digest(self.__read_sources(group))
+        except IOError, e:
+            logging.warning("Not bundling " + group.get_manifest_key() + ", sources unreadable: " + str(e))
+            return None
+
+        if digest != entry.get(AssetBundler.MANIFEST_DIGEST, None):
+            logging.warning("Not bundling " + group.get_manifest_key() + ", sources changed since the bundle was built")
+            return None
+
+        return entry.get(AssetBundler.MANIFEST_BUNDLE, None)
+
+    def __read_sources(self, group):
+        """
+        Reads every file in a group
+
+        @param group: The group to read
+        @type group: AssetGroup
+        @return: Contents of each file in the order of the group's sources
+        @rtype: List of Strings
+        """
+        contents = []
+        for source in group.sources:
+            with open(self.__get_file_loc(source), "rb") as f:
+                contents.append(f.read())
+        return contents
+
+    def __get_digest(self, sources):
+        """
+        Hashes the contents of a group's files
+
+        @param sources: Contents of each file in the group
+        @type sources: List of Strings
+        @return: Hex digest identifying the contents
+        @rtype: String
+        """
+        digest = hashlib.sha1()
+        for contents in sources:
+            digest.update(hashlib.sha1(contents).digest())
+        return digest.hexdigest()
+
+    def __concatenate(self, group, sources):
+        """
+        Combines every file in a group into a single bundle
+
+        @note: Scripts are concatenated as they are. Whitespace in them can be
+               significant (line continuations, strings), and responses are gzipped.
+        @param group: The group to bundle
+        @type group: AssetGroup
+        @param sources: Contents of each file in the group
+        @type sources: List of Strings
+        @return: The bundle contents
+        @rtype: String
+        """
+        # Guard against scripts that do not end their last statement
+        if group.asset_type == "js":
+            return ";\n".join(sources)
+
+        parts = map(lambda x: self.__minify_css(x[0], x[1]), zip(sources, group.sources))
+        return "\n".join(parts)
+
+    def __minify_css(self, contents, source):
+        """
+        Strips comments and whitespace from a stylesheet, pointing relative urls at the original location
+
+        @param contents: The stylesheet to minify
+        @type contents: String
+        @param source: The URL the stylesheet was referenced by
+        @type source: String
+        @return: The minified stylesheet
+        @rtype: String
+        """
+        base_url = "/" + os.path.dirname(source.lstrip("/"))
+
+        def absolute_url(match):
+            url = match.group(1)
+            if url.startswith("/") or url.startswith("data:") or not self.__is_local(url):
+                return match.group(0)
+            return "url(%s)" % os.path.normpath(os.path.join(base_url, url))
+
+        contents = AssetBundler.CSS_COMMENT_REGEX.sub("", contents)
+        contents = AssetBundler.CSS_URL_REGEX.sub(absolute_url, contents)
+        contents = AssetBundler.CSS_WHITESPACE_REGEX.sub(" ", contents)
+        contents = AssetBundler.CSS_PUNCTUATION_REGEX.sub(r"\1", contents)
+        return contents.strip()
+
+    def __load_manifest(self):
+        """
+        Reads the manifest of previously built bundles
+
+        @return: Manifest keys mapped to bundle URLs (empty if nothing was built)
+        @rtype: Dictionary from String to String
+        """
+        if self.__manifest != None:
+            return self.__manifest
+
+        loc = os.path.join(self.__static_root, self.__bundle_dir, AssetBundler.MANIFEST_NAME)
+        try:
+            with open(loc) as f:
+                self.__manifest = json.load(f)
+        except (IOError, ValueError), e:
+            logging.debug("Asset bundle manifest unavailable: " + str(e))
+            self.__manifest = {}
+
+        return self.__manifest
+
+    def __get_file_loc(self, source):
+        """
+        Gets the location on disk of a static URL
+
+        @param source: The URL of the asset
+        @type source: String
+        @return: Path to the asset
+        @rtype: String
+        """
+        return os.path.join(self.__static_root, source.lstrip("/"))
+
+    def __is_local(self, source):
+        """
+        Determines if an asset is served by this app
+
+        @param source: The URL of the asset
+        @type source: String
+        @return: True if the asset is a path on this app and False for other hosts
+        @rtype: Boolean
+        """
+        return not "://" in source and not source.startswith("//")
+
+if __name__ == "__main__":
+    import sys
+    import builders
+
+    # Run from the app root before deploying: python page_builder/bundlers.py [template ...]
+    bundler = AssetBundler()
+    for template in sys.argv[1:] or ["app.html"]:
+        page = builders.PageBuilder(template, "./views", "{* %s *}").render()
+        bundler.build(page)
+        print "Bundled assets for " + template
@@ -3,6 +3,60 @@ Facades to manage page builders and their cached results
 """
 
 import builders
+import bundlers
+import prerenderers
+import gzip
+import hashlib
+import StringIO
+
+class RenderedPage:
+    """
+    An assembled page along with the validator and compressed copy needed to serve it
+    """
+
+    def __init__(self, contents):
+        """
+        Create a new rendered page, hashing and compressing its contents once
+
+        @param contents: The assembled page
+        @type contents: String
+        """
+        self.__contents = contents
+        self.__etag = hashlib.sha1(contents).hexdigest()
+
+        # A fixed mtime keeps the compressed bytes identical between instances
+        buf = StringIO.StringIO()
+        compressor = gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0)
+        compressor.write(contents)
+        compressor.close()
+        self.__gzipped = buf.getvalue()
+
+    def get_contents(self):
+        """
+        Get the uncompressed page
+
+        @return: The assembled page
+        @rtype: String
+        """
+        return self.__contents
+
+    def get_gzipped(self):
+        """
+        Get the page compressed with gzip
+
+        @return: The gzipped page
+        @rtype: String
+        """
+        return self.__gzipped
+
+    def get_etag(self):
+        """
+        Get the content hash identifying this version of the page
+
+        @return: Hex digest of the uncompressed page
+        @rtype: String
+        """
+        return self.__etag
 
 class PageManager:
     """
@@ -33,17 +87,68 @@ class PageManager:
         self.__templates_dir = PageManager.DEFAULT_TEMPLATES_DIR
         self.__tag = PageManager.DEFAULT_TAG
         self.__builders = {}
+        self.__bundler = bundlers.AssetBundler()
+        self.__prerenderer = prerenderers.EJSPrerenderer()
+
+        # File names and prerender flags mapped to the assembled template and the page served for it
+        self.__pages = {}
     
-    def render(self, filename):
+    def render(self, filename, prerender=True):
         """
         Render out the template at the given filename
 
         @param filename: The name of the template to render out
         @type filename: String
+        @keyword prerender: Prerender the EJS view fragments included in the template.
+                            Defaults to True.
+        @type prerender: Boolean
         @return: The pre-processed template
         @rtype: String
         """
-        if not filename in self.__builders:
-            self.__builders[filename] = builders.PageBuilder(filename, self.__templates_dir, self.__tag)
+        key = (filename, prerender)
+        if not key in self.__builders:
+            if prerender:
+                prerenderer = self.__prerenderer
+            else:
+                prerenderer = None
+            self.__builders[key] = builders.PageBuilder(filename, self.__templates_dir, self.__tag,
+                prerenderer=prerenderer)
         
-        return self.__builders[filename].render()
\ No newline at end of file
+        return self.__builders[key].render()
+
+    def render_page(self, filename, prerender=True):
+        """
+        Render out the template at the given filename along with its hash and gzipped copy
+
+        @note: The page is only hashed and compressed again when its contents change.
+               Outside of development, assets are referenced through their bundles.
+        @param filename: The name of the template to render out
+        @type filename: String
+        @keyword prerender: Prerender the EJS view fragments included in the template.
+                            Defaults to True.
+        @type prerender: Boolean
+        @return: The pre-processed template ready to be served
+        @rtype: RenderedPage
+        """
+        contents = self.render(filename, prerender)
+
+        # Builders hand back the same string until a template changes
+        key = (filename, prerender)
+        source, page = self.__pages.get(key, (None, None))
+        if not source is contents:
+            if builders.PageBuilder.DEBUG:
+                page = RenderedPage(contents)
+            else:
+                page = RenderedPage(self.__bundler.rewrite(contents))
+            self.__pages[key] = (contents, page)
+
+        return page
+
+    def get_prerender_stats(self):
+        """
+        Gets counters describing the prerendering of view fragments
+
+        @return: Counts of cache hits and misses and the seconds spent compiling
+        @rtype: Dictionary from String to number
+        """
+        return self.__prerenderer.get_stats()
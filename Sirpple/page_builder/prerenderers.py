@@ -0,0 +1,164 @@
+"""
+Server side preparation of the EJS view fragments embedded in pages
+"""
+
+import hashlib
+import json
+import re
+import time
+
+class EJSPrerenderer:
+    """
+    Prerenders EJS view fragments so the client does not have to compile them
+
+    Fragments without any EJS tags are already static and are left as markup.
+    Fragments with tags keep their markup in the page and are followed by the same
+    function ejs_production.js would build, registered with EJS as a precompiled
+    template. Results are cached by the hash of the fragment so unchanged fragments
+    are only compiled once.
+    """
+
+    LEFT_DELIMITER = "<%"
+    LEFT_EQUAL = "<%="
+    LEFT_COMMENT = "<%#"
+    RIGHT_DELIMITER = "%>"
+    DOUBLE_LEFT = "<%%"
+    DOUBLE_RIGHT = "%%>"
+
+    PRE_COMMAND = "var ___ViewO = [];"
+    PUT_COMMAND = "___ViewO.push("
+
+    TOKEN_REGEX = re.compile(r"(<%%|%%>|<%=|<%#|<%|%>|\n)")
+
+    FUNCTION_TEMPLATE = ("function(_CONTEXT,_VIEW) { try { with(_VIEW) { with (_CONTEXT) {%s return ___ViewO.join('');}}}"
+        "catch(e){e.lineNumber=null;throw e;}}")
+    REGISTER_TEMPLATE = '<script type="text/javascript">new EJS({name: %s, precompiled: %s});</script>'
+
+    def __init__(self):
+        # Fragment hashes mapped to their prerendered output
+        self.__cache = {}
+        self.reset_stats()
+
+    def prerender(self, name, template):
+        """
+        Prerenders the given view fragment
+
+        @param name: The name the template is registered with EJS under
+        @type name: String
+        @param template: The contents of the view fragment
+        @type template: String
+        @return: The fragment itself, followed by a script registering it precompiled if it has tags
+        @rtype: String
+        """
+        if template.find(EJSPrerenderer.LEFT_DELIMITER) == -1:
+            return template
+
+        key = hashlib.sha1(name + "\0" + template).hexdigest()
+        if key in self.__cache:
+            self.__hits += 1
+            return self.__cache[key]
+
+        start = time.time()
+        function = EJSPrerenderer.FUNCTION_TEMPLATE % self.compile(template)
+        output = template + EJSPrerenderer.REGISTER_TEMPLATE % (json.dumps(name), function)
+        self.__compile_time += time.time() - start
+        self.__misses += 1
+
+        self.__cache[key] = output
+        return output
+
+    def compile(self, template):
+        """
+        Converts an EJS template into the body of its render function
+
+        @note: Mirrors EJS.Compiler in ejs_production.js for the default "<" delimiter
+        @param template: The EJS template to compile
+        @type template: String
+        @return: Javascript that pushes the rendered output onto ___ViewO
+        @rtype: String
+        """
+        template = template.replace("\r\n", "\n").replace("\r", "\n")
+
+        script = []
+        line = [EJSPrerenderer.PRE_COMMAND]
+        content = ""
+        start_tag = None
+
+        for token in EJSPrerenderer.TOKEN_REGEX.split(template):
+            if token == "":
+                continue
+
+            if start_tag == None:
+                if token == "\n":
+                    line.append(self.__put(content + "\n") + ";")
+                    script.append("; ".join(line) + "\n")
+                    line = []
+                    content = ""
+                elif token in (EJSPrerenderer.LEFT_DELIMITER, EJSPrerenderer.LEFT_EQUAL, EJSPrerenderer.LEFT_COMMENT):
+                    start_tag = token
+                    if content:
+                        line.append(self.__put(content))
+                    content = ""
+                elif token == EJSPrerenderer.DOUBLE_LEFT:
+                    content += EJSPrerenderer.LEFT_DELIMITER
+                else:
+                    content += token
+            else:
+                if token == EJSPrerenderer.RIGHT_DELIMITER:
+                    if start_tag == EJSPrerenderer.LEFT_DELIMITER:
+                        if content.endswith("\n"):
+                            line.append(content[:-1])
+                            script.append("; ".join(line) + "\n")
+                            line = []
+                        else:
+                            line.append(content)
+                    elif start_tag == EJSPrerenderer.LEFT_EQUAL:
+                        line.append(EJSPrerenderer.PUT_COMMAND + "(EJS.Scanner.to_text(" + content + ")))")
+                    start_tag = None
+                    content = ""
+                elif token == EJSPrerenderer.DOUBLE_RIGHT:
+                    content += EJSPrerenderer.RIGHT_DELIMITER
+                else:
+                    content += token
+
+        if content:
+            line.append(self.__put(content))
+        if line:
+            script.append("; ".join(line))
+
+        return "".join(script) + ";"
+
+    def get_stats(self):
+        """
+        Gets counters describing how much compilation the cache saved
+
+        @return: Counts of cache hits and misses and the seconds spent compiling
+        @rtype: Dictionary from String to number
+        """
+        return {
+            "hits" : self.__hits,
+            "misses" : self.__misses,
+            "compile_time" : self.__compile_time,
+            "entries" : len(self.__cache)
+        }
+
+    def reset_stats(self):
+        """ Sets all of the counters back to zero """
+        self.__hits = 0
+        self.__misses = 0
+        self.__compile_time = 0.0
+
+    def __put(self, content):
+        """
+        Creates the statement that outputs literal template content
+
+        @param content: The literal content
+        @type content: String
+        @return: Javascript pushing content onto ___ViewO
+        @rtype: String
+        """
+        content = content.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+        # Keep literal closing tags from ending the inline script early
+        content = content.replace("</", "<\\/")
+        return EJSPrerenderer.PUT_COMMAND + '"' + content + '")'
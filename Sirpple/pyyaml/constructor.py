@@ -17,6 +17,19 @@ class BaseConstructor(object):
     yaml_constructors = {}
     yaml_multi_constructors = {}
 
+    # Constructors that build an immutable value from the scalar alone. Their
+    # results are reused for every scalar with the same tag and value.
+    yaml_cacheable_constructors = set()
+
+    # Bumped whenever a constructor is added anywhere so the scalar caches
+    # below know to start over.
+    yaml_constructors_version = 0
+
+    # `(version, constructors, cacheable tags, cache)` as built by
+    # `get_scalar_cache`.
+    yaml_scalar_cache = (None, None, None, None)
+    MAX_SCALAR_CACHE = 10000
+
     def __init__(self):
         self.constructed_objects = {}
         self.recursive_objects = {}
@@ -55,6 +68,16 @@ class BaseConstructor(object):
     def construct_object(self, node, deep=False):
         if node in self.constructed_objects:
             return self.constructed_objects[node]
+        key = None
+        if node.__class__ is ScalarNode:
+            version, constructors, tags, cache = self.yaml_scalar_cache
+            if version != BaseConstructor.yaml_constructors_version \
+                    or constructors is not self.yaml_constructors:
+                tags, cache = self.get_scalar_cache()
+            if node.tag in tags:
+                key = (node.tag, node.value)
+                if key in cache:
+                    return cache[key]
         if deep:
             old_deep = self.deep_construct
             self.deep_construct = True
@@ -96,6 +119,13 @@ class BaseConstructor(object):
                     pass
             else:
                 self.state_generators.append(generator)
+        if key is not None:
+            # Repeated strings share one interned copy.
+            if type(data) is str:
+                data = intern(data)
+            if len(cache) >= self.MAX_SCALAR_CACHE:
+                cache.clear()
+            cache[key] = data
         self.constructed_objects[node] = data
         del self.recursive_objects[node]
         if deep:
@@ -146,10 +176,33 @@ class BaseConstructor(object):
             pairs.append((key, value))
         return pairs
 
+    def get_scalar_cache(cls):
+        # The tags whose constructors are cacheable, and the cache of their
+        # results. Both are kept on the class that owns the constructors, so
+        # every loader using them shares the cache.
+        for owner in cls.__mro__:
+            if 'yaml_constructors' in owner.__dict__:
+                cls = owner
+                break
+        version, constructors, tags, cache = cls.yaml_scalar_cache
+        if version == BaseConstructor.yaml_constructors_version \
+                and constructors is cls.yaml_constructors:
+            return tags, cache
+        tags = set()
+        for tag, constructor in cls.yaml_constructors.items():
+            if constructor in cls.yaml_cacheable_constructors:
+                tags.add(tag)
+        cache = {}
+        cls.yaml_scalar_cache = (BaseConstructor.yaml_constructors_version,
+                cls.yaml_constructors, tags, cache)
+        return tags, cache
+    get_scalar_cache = classmethod(get_scalar_cache)
+
     def add_constructor(cls, tag, constructor):
         if not 'yaml_constructors' in cls.__dict__:
             cls.yaml_constructors = cls.yaml_constructors.copy()
         cls.yaml_constructors[tag] = constructor
+        BaseConstructor.yaml_constructors_version += 1
     add_constructor = classmethod(add_constructor)
 
     def add_multi_constructor(cls, tag_prefix, multi_constructor):
@@ -464,6 +517,15 @@ SafeConstructor.add_constructor(
 SafeConstructor.add_constructor(None,
         SafeConstructor.construct_undefined)
 
+SafeConstructor.yaml_cacheable_constructors = set([
+        SafeConstructor.construct_yaml_null,
+        SafeConstructor.construct_yaml_bool,
+        SafeConstructor.construct_yaml_int,
+        SafeConstructor.construct_yaml_float,
+        SafeConstructor.construct_yaml_binary,
+        SafeConstructor.construct_yaml_timestamp,
+        SafeConstructor.construct_yaml_str])
+
 class Constructor(SafeConstructor):
 
     def construct_python_str(self, node):
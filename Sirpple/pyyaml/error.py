@@ -1,15 +1,12 @@
 
 __all__ = ['Mark', 'YAMLError', 'MarkedYAMLError']
 
-class Mark(object):
+import bisect
 
-    def __init__(self, name, index, line, column, buffer, pointer):
-        self.name = name
-        self.index = index
-        self.line = line
-        self.column = column
-        self.buffer = buffer
-        self.pointer = pointer
+class BaseMark(object):
+    # Formatting shared by marks. Subclasses provide `name`, `index`, `line`,
+    # `column`, `buffer` and `pointer`.
+    __slots__ = ()
 
     def get_snippet(self, indent=4, max_length=75):
         if self.buffer is None:
@@ -42,6 +39,70 @@ class Mark(object):
             where += ":\n"+snippet
         return where
 
+class Mark(BaseMark):
+    __slots__ = ('name', 'index', 'line', 'column', 'buffer', 'pointer')
+
+    def __init__(self, name, index, line, column, buffer, pointer):
+        self.name = name
+        self.index = index
+        self.line = line
+        self.column = column
+        self.buffer = buffer
+        self.pointer = pointer
+
+class LineIndex(object):
+    # The line break offsets of a document held in memory. It is shared by
+    # the Reader and every LazyMark into the document.
+    __slots__ = ('name', 'buffer', 'breaks')
+
+    def __init__(self, name, buffer, breaks):
+        self.name = name
+        self.buffer = buffer
+        self.breaks = breaks
+
+    def find_line(self, pointer):
+        return bisect.bisect_left(self.breaks, pointer)
+
+    def get_line_start(self, line):
+        if line:
+            return self.breaks[line-1]+1
+        return 0
+
+class LazyMark(BaseMark):
+    # A mark that only stores its offset into a document held in memory.
+    # The line and column are looked up in the shared LineIndex when they are
+    # asked for, which is usually only when an error is reported.
+    __slots__ = ('source', 'pointer')
+
+    def __init__(self, source, pointer):
+        self.source = source
+        self.pointer = pointer
+
+    def get_name(self):
+        return self.source.name
+
+    name = property(get_name)
+
+    def get_index(self):
+        return self.pointer
+
+    index = property(get_index)
+
+    def get_line(self):
+        return self.source.find_line(self.pointer)
+
+    line = property(get_line)
+
+    def get_column(self):
+        return self.pointer-self.source.get_line_start(self.get_line())
+
+    column = property(get_column)
+
+    def get_buffer(self):
+        return self.source.buffer
+
+    buffer = property(get_buffer)
+
 class YAMLError(Exception):
     pass
 
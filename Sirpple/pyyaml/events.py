@@ -1,7 +1,11 @@
 
+# Events keep their attributes in `__slots__`, like tokens. Every subclass
+# declares only the slots it adds.
+
 # Abstract classes.
 
 class Event(object):
+    __slots__ = ('start_mark', 'end_mark')
     def __init__(self, start_mark=None, end_mark=None):
         self.start_mark = start_mark
         self.end_mark = end_mark
@@ -13,12 +17,14 @@ class Event(object):
         return '%s(%s)' % (self.__class__.__name__, arguments)
 
 class NodeEvent(Event):
+    __slots__ = ('anchor',)
     def __init__(self, anchor, start_mark=None, end_mark=None):
         self.anchor = anchor
         self.start_mark = start_mark
         self.end_mark = end_mark
 
 class CollectionStartEvent(NodeEvent):
+    __slots__ = ('tag', 'implicit', 'flow_style')
     def __init__(self, anchor, tag, implicit, start_mark=None, end_mark=None,
             flow_style=None):
         self.anchor = anchor
@@ -29,20 +35,22 @@ class CollectionStartEvent(NodeEvent):
         self.flow_style = flow_style
 
 class CollectionEndEvent(Event):
-    pass
+    __slots__ = ()
 
 # Implementations.
 
 class StreamStartEvent(Event):
+    __slots__ = ('encoding',)
     def __init__(self, start_mark=None, end_mark=None, encoding=None):
         self.start_mark = start_mark
         self.end_mark = end_mark
         self.encoding = encoding
 
 class StreamEndEvent(Event):
-    pass
+    __slots__ = ()
 
 class DocumentStartEvent(Event):
+    __slots__ = ('explicit', 'version', 'tags')
     def __init__(self, start_mark=None, end_mark=None,
             explicit=None, version=None, tags=None):
         self.start_mark = start_mark
@@ -52,6 +60,7 @@ class DocumentStartEvent(Event):
         self.tags = tags
 
 class DocumentEndEvent(Event):
+    __slots__ = ('explicit',)
     def __init__(self, start_mark=None, end_mark=None,
             explicit=None):
         self.start_mark = start_mark
@@ -59,9 +68,10 @@ class DocumentEndEvent(Event):
         self.explicit = explicit
 
 class AliasEvent(NodeEvent):
-    pass
+    __slots__ = ()
 
 class ScalarEvent(NodeEvent):
+    __slots__ = ('tag', 'implicit', 'value', 'style')
     def __init__(self, anchor, tag, implicit, value,
             start_mark=None, end_mark=None, style=None):
         self.anchor = anchor
@@ -73,14 +83,14 @@ class ScalarEvent(NodeEvent):
         self.style = style
 
 class SequenceStartEvent(CollectionStartEvent):
-    pass
+    __slots__ = ()
 
 class SequenceEndEvent(CollectionEndEvent):
-    pass
+    __slots__ = ()
 
 class MappingStartEvent(CollectionStartEvent):
-    pass
+    __slots__ = ()
 
 class MappingEndEvent(CollectionEndEvent):
-    pass
+    __slots__ = ()
 
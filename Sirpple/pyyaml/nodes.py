@@ -1,5 +1,8 @@
 
+# Nodes keep their attributes in `__slots__`, like tokens and events.
+
 class Node(object):
+    __slots__ = ('tag', 'value', 'start_mark', 'end_mark')
     def __init__(self, tag, value, start_mark, end_mark):
         self.tag = tag
         self.value = value
@@ -23,6 +26,7 @@ class Node(object):
         return '%s(tag=%r, value=%s)' % (self.__class__.__name__, self.tag, value)
 
 class ScalarNode(Node):
+    __slots__ = ('style',)
     id = 'scalar'
     def __init__(self, tag, value,
             start_mark=None, end_mark=None, style=None):
@@ -33,6 +37,7 @@ class ScalarNode(Node):
         self.style = style
 
 class CollectionNode(Node):
+    __slots__ = ('flow_style',)
     def __init__(self, tag, value,
             start_mark=None, end_mark=None, flow_style=None):
         self.tag = tag
@@ -42,8 +47,10 @@ class CollectionNode(Node):
         self.flow_style = flow_style
 
 class SequenceNode(CollectionNode):
+    __slots__ = ()
     id = 'sequence'
 
 class MappingNode(CollectionNode):
+    __slots__ = ()
     id = 'mapping'
 
@@ -14,10 +14,15 @@
 #   reader.forward(length=1) - move the current position to `length` characters.
 #   reader.index - the number of the current character.
 #   reader.line, stream.column - the line and the column of the current character.
+#
+# When the whole document is already in memory (a `str` or `unicode` object)
+# the buffer is never refilled, so `forward` only moves the pointer and the
+# line and column are looked up from an index of line break offsets when they
+# are asked for. Marks into such documents only record the offset.
 
 __all__ = ['Reader', 'ReaderError']
 
-from error import YAMLError, Mark
+from error import YAMLError, Mark, LazyMark, LineIndex
 
 import codecs, re
 
@@ -56,6 +61,10 @@ class Reader(object):
 
     # Yeah, it's ugly and slow.
 
+    # Characters that end a line. A '\r' followed by '\n' is counted as part
+    # of the '\n' break.
+    LINE_BREAK = re.compile(u'[\n\x85\u2028\u2029]|\r(?!\n)')
+
     def __init__(self, stream):
         self.name = None
         self.stream = None
@@ -69,6 +78,7 @@ class Reader(object):
         self.index = 0
         self.line = 0
         self.column = 0
+        self.in_memory = False
         if isinstance(stream, unicode):
             self.name = "<unicode string>"
             self.check_printable(stream)
@@ -83,6 +93,56 @@ class Reader(object):
             self.eof = False
             self.raw_buffer = ''
             self.determine_encoding()
+        if self.stream is None:
+            self.index_line_breaks()
+
+    # In memory, the line and column are derived from the pointer only when
+    # they are asked for. Streams keep counting them in `forward`.
+
+    def get_line(self):
+        if self.in_memory and not \
+                self.line_start <= self.pointer <= self.line_end:
+            self.locate()
+        return self.stream_line
+
+    def set_line(self, line):
+        self.stream_line = line
+
+    line = property(get_line, set_line)
+
+    def get_column(self):
+        if self.in_memory:
+            if not self.line_start <= self.pointer <= self.line_end:
+                self.locate()
+            return self.pointer-self.line_start
+        return self.stream_column
+
+    def set_column(self, column):
+        self.stream_column = column
+
+    column = property(get_column, set_column)
+
+    def index_line_breaks(self):
+        # A BOM inside the document does not take up a column, which the
+        # offsets can not account for, so leave those to the slow path.
+        if u'\uFEFF' in self.buffer:
+            return
+        breaks = [match.start()
+                for match in self.LINE_BREAK.finditer(self.buffer)]
+        breaks.append(len(self.buffer))
+        self.line_index = LineIndex(self.name, self.buffer, breaks)
+        self.line_start = 0
+        self.line_end = breaks[0]
+        self.stream_line = 0
+        self.in_memory = True
+
+    def locate(self):
+        # Scalars rarely leave the current line, so the break offsets are only
+        # searched once the pointer has moved past the line found last.
+        line = self.line_index.find_line(self.pointer)
+        self.line_start = self.line_index.get_line_start(line)
+        self.line_end = self.line_index.breaks[line]
+        self.stream_line = line
 
     def peek(self, index=0):
         try:
@@ -97,6 +157,10 @@ class Reader(object):
         return self.buffer[self.pointer:self.pointer+length]
 
     def forward(self, length=1):
+        if self.in_memory:
+            self.pointer += length
+            self.index = self.pointer
+            return
         if self.pointer+length+1 >= len(self.buffer):
             self.update(length+1)
         while length:
@@ -105,14 +169,16 @@ class Reader(object):
             self.index += 1
             if ch in u'\n\x85\u2028\u2029'  \
                     or (ch == u'\r' and self.buffer[self.pointer] != u'\n'):
-                self.line += 1
-                self.column = 0
+                self.stream_line += 1
+                self.stream_column = 0
             elif ch != u'\uFEFF':
-                self.column += 1
+                self.stream_column += 1
             length -= 1
 
     def get_mark(self):
-        if self.stream is None:
+        if self.in_memory:
+            return LazyMark(self.line_index, self.pointer)
+        elif self.stream is None:
             return Mark(self.name, self.index, self.line, self.column,
                     self.buffer, self.pointer)
         else:
@@ -18,6 +18,15 @@ class BaseResolver(object):
     yaml_implicit_resolvers = {}
     yaml_path_resolvers = {}
 
+    # Bumped whenever an implicit resolver is added anywhere so the compiled
+    # dispatch tables below know to rebuild.
+    yaml_implicit_version = 0
+
+    # `(version, resolvers, table, cache)` as built by `get_implicit_dispatch`.
+    # The cache maps scalar values to the implicit tag they resolved to.
+    yaml_implicit_dispatch = (None, None, None, None)
+    MAX_IMPLICIT_CACHE = 10000
+
     def __init__(self):
         self.resolver_exact_paths = []
         self.resolver_prefix_paths = []
@@ -29,8 +38,67 @@ class BaseResolver(object):
             first = [None]
         for ch in first:
             cls.yaml_implicit_resolvers.setdefault(ch, []).append((tag, regexp))
+        BaseResolver.yaml_implicit_version += 1
     add_implicit_resolver = classmethod(add_implicit_resolver)
 
+    def get_implicit_dispatch(cls):
+        # The implicit resolvers for each first character, together with the
+        # ones registered for any character, compiled into one alternation.
+        # Each alternative is a named group, so `match.lastgroup` names the
+        # resolver that matched. The table and the cache of resolved values
+        # are kept on the class that owns the resolvers, so every loader and
+        # dumper using them shares both.
+        for owner in cls.__mro__:
+            if 'yaml_implicit_resolvers' in owner.__dict__:
+                cls = owner
+                break
+        version, resolvers, table, cache = cls.yaml_implicit_dispatch
+        if version == BaseResolver.yaml_implicit_version    \
+                and resolvers is cls.yaml_implicit_resolvers:
+            return table, cache
+        any_first = cls.yaml_implicit_resolvers.get(None, [])
+        table = {None: cls.combine_implicit_resolvers(any_first)}
+        for ch, resolvers in cls.yaml_implicit_resolvers.items():
+            if ch is not None:
+                table[ch] = cls.combine_implicit_resolvers(resolvers+any_first)
+        cache = {}
+        cls.yaml_implicit_dispatch = (BaseResolver.yaml_implicit_version,
+                cls.yaml_implicit_resolvers, table, cache)
+        return table, cache
+    get_implicit_dispatch = classmethod(get_implicit_dispatch)
+
+    def combine_implicit_resolvers(cls, resolvers):
+        # Returns `(regexp, tags)` where `tags` maps group names to tags, or
+        # `(None, resolvers)` when the regexps can not be safely combined and
+        # have to be tried one after another.
+        if not resolvers:
+            return None, []
+        flags = resolvers[0][1].flags & ~re.X
+        verbose = False
+        for tag, regexp in resolvers:
+            if regexp.groups or regexp.flags & ~re.X != flags:
+                return None, resolvers
+            if regexp.flags & re.X:
+                verbose = True
+        parts = []
+        tags = {}
+        for index, (tag, regexp) in enumerate(resolvers):
+            pattern = regexp.pattern
+            if verbose and not regexp.flags & re.X:
+                # Whitespace and '#' would change meaning in verbose mode.
+                if re.search(r'[\s#]', pattern):
+                    return None, resolvers
+            name = 'r%d' % index
+            # The line break ends any trailing comment in a verbose pattern.
+            parts.append(u'(?P<%s>%s\n)' % (name, pattern))
+            tags[name] = tag
+        if verbose:
+            flags |= re.X
+        else:
+            parts = [part[:-2]+u')' for part in parts]
+        return re.compile(u'|'.join(parts), flags), tags
+    combine_implicit_resolvers = classmethod(combine_implicit_resolvers)
+
     def add_path_resolver(cls, tag, path, kind=None):
         # Note: `add_path_resolver` is experimental.  The API could be changed.
         # `new_path` is a pattern that is matched against the path from the
@@ -137,16 +205,37 @@ class BaseResolver(object):
                 return
         return True
 
+    def resolve_implicit(self, dispatch, value):
+        # The tag of the first implicit resolver matching `value` or None.
+        if value == u'':
+            regexp, tags = dispatch.get(u'', dispatch[None])
+        else:
+            regexp, tags = dispatch.get(value[0], dispatch[None])
+        if regexp is not None:
+            match = regexp.match(value)
+            if match:
+                return tags[match.lastgroup]
+        else:
+            for tag, regexp in tags:
+                if regexp.match(value):
+                    return tag
+        return None
+
     def resolve(self, kind, value, implicit):
         if kind is ScalarNode and implicit[0]:
-            if value == u'':
-                resolvers = self.yaml_implicit_resolvers.get(u'', [])
+            version, resolvers, dispatch, cache = self.yaml_implicit_dispatch
+            if version != BaseResolver.yaml_implicit_version    \
+                    or resolvers is not self.yaml_implicit_resolvers:
+                dispatch, cache = self.get_implicit_dispatch()
+            if value in cache:
+                tag = cache[value]
             else:
-                resolvers = self.yaml_implicit_resolvers.get(value[0], [])
-            resolvers += self.yaml_implicit_resolvers.get(None, [])
-            for tag, regexp in resolvers:
-                if regexp.match(value):
-                    return tag
+                tag = self.resolve_implicit(dispatch, value)
+                if len(cache) >= self.MAX_IMPLICIT_CACHE:
+                    cache.clear()
+                cache[value] = tag
+            if tag is not None:
+                return tag
             implicit = implicit[1]
         if self.yaml_path_resolvers:
             exact_paths = self.resolver_exact_paths[-1]
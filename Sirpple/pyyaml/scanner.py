@@ -29,6 +29,8 @@ __all__ = ['Scanner', 'ScannerError']
 from error import MarkedYAMLError
 from tokens import *
 
+import re
+
 class ScannerError(MarkedYAMLError):
     pass
 
@@ -45,6 +47,16 @@ class SimpleKey(object):
 
 class Scanner(object):
 
+    # When the Reader holds the whole document (`self.in_memory`), runs of
+    # plain scalar characters, spaces and comments are matched directly
+    # against its buffer instead of one `peek()` at a time. The buffer always
+    # ends with '\0', which none of these match.
+    PLAIN_BLOCK_RUN = re.compile(ur'[^\x00 \t\r\n\x85\u2028\u2029:]*'
+            ur'(?::(?![\x00 \t\r\n\x85\u2028\u2029])[^\x00 \t\r\n\x85\u2028\u2029:]*)*')
+    PLAIN_FLOW_RUN = re.compile(ur'[^\x00 \t\r\n\x85\u2028\u2029,:?\[\]{}]*')
+    SPACES_RUN = re.compile(ur' *')
+    COMMENT_RUN = re.compile(ur'#[^\x00\r\n\x85\u2028\u2029]*')
+
     def __init__(self):
         """Initialize the scanner."""
         # It is assumed that Scanner and Reader will have a common descendant.
@@ -774,11 +786,18 @@ class Scanner(object):
             self.forward()
         found = False
         while not found:
-            while self.peek() == u' ':
-                self.forward()
-            if self.peek() == u'#':
-                while self.peek() not in u'\0\r\n\x85\u2028\u2029':
+            if self.in_memory:
+                self.forward(self.SPACES_RUN.match(self.buffer,
+                    self.pointer).end()-self.pointer)
+                if self.peek() == u'#':
+                    self.forward(self.COMMENT_RUN.match(self.buffer,
+                        self.pointer).end()-self.pointer)
+            else:
+                while self.peek() == u' ':
                     self.forward()
+                if self.peek() == u'#':
+                    while self.peek() not in u'\0\r\n\x85\u2028\u2029':
+                        self.forward()
             if self.scan_line_break():
                 if not self.flow_level:
                     self.allow_simple_key = True
@@ -1292,14 +1311,22 @@ class Scanner(object):
             length = 0
             if self.peek() == u'#':
                 break
-            while True:
-                ch = self.peek(length)
-                if ch in u'\0 \t\r\n\x85\u2028\u2029'   \
-                        or (not self.flow_level and ch == u':' and
-                                self.peek(length+1) in u'\0 \t\r\n\x85\u2028\u2029') \
-                        or (self.flow_level and ch in u',:?[]{}'):
-                    break
-                length += 1
+            if self.in_memory:
+                if self.flow_level:
+                    run = self.PLAIN_FLOW_RUN
+                else:
+                    run = self.PLAIN_BLOCK_RUN
+                length = run.match(self.buffer, self.pointer).end()-self.pointer
+                ch = self.buffer[self.pointer+length]
+            else:
+                while True:
+                    ch = self.peek(length)
+                    if ch in u'\0 \t\r\n\x85\u2028\u2029'   \
+                            or (not self.flow_level and ch == u':' and
+                                    self.peek(length+1) in u'\0 \t\r\n\x85\u2028\u2029') \
+                            or (self.flow_level and ch in u',:?[]{}'):
+                        break
+                    length += 1
             # It's not clear what we should do with ':' in the flow context.
             if (self.flow_level and ch == u':'
                     and self.peek(length+1) not in u'\0 \t\r\n\x85\u2028\u2029,[]{}'):
@@ -1326,8 +1353,11 @@ class Scanner(object):
         # We just forbid them completely. Do not use tabs in YAML!
         chunks = []
         length = 0
-        while self.peek(length) in u' ':
-            length += 1
+        if self.in_memory:
+            length = self.SPACES_RUN.match(self.buffer, self.pointer).end()-self.pointer
+        else:
+            while self.peek(length) in u' ':
+                length += 1
         whitespaces = self.prefix(length)
         self.forward(length)
         ch = self.peek()
@@ -1341,7 +1371,11 @@ class Scanner(object):
             breaks = []
             while self.peek() in u' \r\n\x85\u2028\u2029':
                 if self.peek() == ' ':
-                    self.forward()
+                    if self.in_memory:
+                        self.forward(self.SPACES_RUN.match(self.buffer,
+                            self.pointer).end()-self.pointer)
+                    else:
+                        self.forward()
                 else:
                     breaks.append(self.scan_line_break())
                     prefix = self.prefix(3)
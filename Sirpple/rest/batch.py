@@ -0,0 +1,287 @@
+"""
+Module containing logic to apply many REST operations across model classes at once
+"""
+
+from google.appengine.ext import db
+from backends import platform_manager
+from serialization import adapted_models
+from serialization import config_model
+
+class BatchOperation:
+    """ A single create, update or delete requested as part of a batch """
+
+    UPDATE = "POST"
+    CREATE = "PUT"
+    DELETE = "DELETE"
+
+    def __init__(self, action, class_definition, key, parent_key, values):
+        """
+        Create a new operation
+
+        @param action: One of UPDATE, CREATE or DELETE
+        @type action: String
+        @param class_definition: Definition of the class being operated on
+        @type class_definition: ClassDefinition
+        @param key: Key of the existing entity (None for CREATE)
+        @type key: Key
+        @param parent_key: Key of the parent for a new entity (None unless CREATE)
+        @type parent_key: Key
+        @param values: Exposed field names mapped to their new values
+        @type values: Dictionary
+        """
+        self.action = action
+        self.class_definition = class_definition
+        self.key = key
+        self.parent_key = parent_key
+        self.values = values
+        self.instance = None
+
+    def get_entity_group_key(self):
+        """
+        Get the key of the root entity this operation's entity lives under
+
+        @return: Key of the entity group root
+        @rtype: Key
+        """
+        key = self.key
+        if key == None:
+            key = self.parent_key
+
+        while key.parent() != None:
+            key = key.parent()
+
+        return key
+
+class GAEBatchProcessor:
+    """
+    Applies a list of operations with one batched read, one authorization
+    check per entity group and one batched write / delete
+    """
+
+    ACTION_FIELD = "action"
+    CLASS_FIELD = "__class__"
+    KEY_FIELD = "__key__"
+    PARENT_FIELD = "parent"
+    VALUES_FIELD = "fields"
+
+    MAX_OPERATIONS = 500
+
+    def __init__(self, uac_checker):
+        """
+        Create a new processor that authorizes through the given checker
+
+        @param uac_checker: The checker to authorize entity groups with
+        @type uac_checker: UACChecker
+        """
+        self.__uac_checker = uac_checker
+
+    def parse(self, sources):
+        """
+        Validates and converts raw operations against their config defined class definitions
+
+        @param sources: Operations as decoded from the request
+        @type sources: List of Dictionaries
+        @return: Validated operations
+        @rtype: List of BatchOperations
+        @raise ValueError: Raised if any operation is invalid or an entity is operated on more than once
+        """
+        if not isinstance(sources, list):
+            raise ValueError("Batch must be a list of operations")
+        if len(sources) > GAEBatchProcessor.MAX_OPERATIONS:
+            raise ValueError("Batch may not have more than %d operations" % GAEBatchProcessor.MAX_OPERATIONS)
+
+        operations = map(self.__parse_operation, sources)
+
+        # The outcome of two operations on one entity would depend on the order they are applied in
+        seen = set()
+        for operation in filter(lambda x: x.key != None, operations):
+            if operation.key in seen:
+                raise ValueError(str(operation.key) + " is operated on more than once")
+            seen.add(operation.key)
+
+        return operations
+
+    def load(self, operations):
+        """
+        Reads every entity being updated or deleted in one datastore call
+
+        @param operations: The operations to load entities for
+        @type operations: List of BatchOperations
+        @raise ValueError: Raised if an entity does not exist or is not of the expected class
+        """
+        existing = filter(lambda x: x.key != None, operations)
+        instances = self.__get_all(map(lambda x: x.key, existing))
+
+        for operation, instance in zip(existing, instances):
+            if instance == None:
+                raise ValueError("No entity found for " + str(operation.key))
+            if not isinstance(instance, operation.class_definition.get_class()):
+                raise ValueError(str(operation.key) + " is not a " + operation.class_definition.get_name())
+            operation.instance = instance
+
+    def is_authorized(self, operations, user):
+        """
+        Checks that user may operate on every entity group touched by the operations
+
+        @param operations: The operations to check
+        @type operations: List of BatchOperations
+        @param user: The user that wishes to apply the operations
+        @type user: The backend-specific user representation
+        @return: True if every entity group is accessible and False otherwise
+        @rtype: Boolean
+        """
+        group_keys = list(set(map(lambda x: x.get_entity_group_key(), operations)))
+
+        try:
+            roots = self.__get_all(group_keys)
+        except ValueError:
+            return False
+
+        for root in roots:
+            if root == None or not self.__uac_checker.is_authorized(root, user):
+                return False
+
+        return True
+
+    def commit(self, operations):
+        """
+        Applies the operations with one batched put and one batched delete
+
+        @param operations: Loaded and authorized operations
+        @type operations: List of BatchOperations
+        @return: Created and updated instances in the order given
+        @rtype: List of model instances
+        """
+        to_put = []
+        to_delete = []
+
+        for operation in operations:
+
+            if operation.action == BatchOperation.DELETE:
+                to_delete.append(operation.key)
+                continue
+
+            if operation.action == BatchOperation.CREATE:
+                target_class = operation.class_definition.get_class()
+                operation.instance = target_class(parent=operation.parent_key, **operation.values)
+            else:
+                for field_name, value in operation.values.items():
+                    setattr(operation.instance, field_name, value)
+
+            to_put.append(operation.instance)
+
+        # Go through the adapted model so cached copies are cleared
+        if to_put:
+            adapted_models.GAEAdaptedModel.put_many(to_put)
+        if to_delete:
+            adapted_models.GAEAdaptedModel.delete_many(to_delete)
+
+        return to_put
+
+    def __parse_operation(self, source):
+        """
+        Converts a single raw operation
+
+        @param source: Operation as decoded from the request
+        @type source: Dictionary
+        @return: Validated operation
+        @rtype: BatchOperation
+        @raise ValueError: Raised if the operation is invalid
+        """
+        if not isinstance(source, dict):
+            raise ValueError("Operation must be an object")
+
+        action = source.get(GAEBatchProcessor.ACTION_FIELD, None)
+        if not action in (BatchOperation.UPDATE, BatchOperation.CREATE, BatchOperation.DELETE):
+            raise ValueError("Invalid action " + str(action))
+
+        # Raises ValueError for unregistered classes
+        factory = config_model.ConfigModelFactory.get_instance()
+        class_definition = factory.get_class_definition(str(source.get(GAEBatchProcessor.CLASS_FIELD, "")))
+
+        sent_values = source.get(GAEBatchProcessor.VALUES_FIELD, {})
+        if not isinstance(sent_values, dict):
+            raise ValueError("Fields must be an object")
+
+        # The parent is part of the key, so it can only be given when creating
+        sent_values = dict(sent_values)
+        parent_field_name = platform_manager.PlatformManager.get_instance().get_parent_field_name()
+        sent_parent = sent_values.pop(parent_field_name, None)
+        if sent_parent != None and action != BatchOperation.CREATE:
+            raise ValueError("The parent of an existing entity can not be changed")
+
+        # Find what is being operated on
+        if action == BatchOperation.CREATE:
+            key = None
+            parent_key = self.__parse_key(source.get(GAEBatchProcessor.PARENT_FIELD, sent_parent))
+            if sent_parent != None and parent_key != self.__parse_key(sent_parent):
+                raise ValueError("Conflicting parents given for a new " + class_definition.get_name())
+        else:
+            key = self.__parse_key(source.get(GAEBatchProcessor.KEY_FIELD, None))
+            parent_key = None
+
+        # Check and convert values
+        fields = class_definition.get_fields()
+        properties = class_definition.get_class().properties()
+        values = {}
+        for field_name, value in sent_values.items():
+            field_name = str(field_name)
+
+            if not field_name in fields or not fields[field_name].is_exposed():
+                raise ValueError("Invalid field " + field_name + " for " + class_definition.get_name())
+
+            if fields[field_name].get_field_type().is_reference() and value != None:
+                value = self.__parse_key(value)
+
+            # Reject wrongly typed values now instead of when committing
+            try:
+                properties[field_name].validate(value)
+            except db.BadValueError, e:
+                raise ValueError("Invalid value for " + field_name + ": " + str(e))
+
+            values[field_name] = value
+
+        return BatchOperation(action, class_definition, key, parent_key, values)
+
+    def __get_all(self, keys):
+        """
+        Reads entities through their model classes so the adapted model caches are used
+
+        @param keys: Keys of the entities to read
+        @type keys: List of Keys
+        @return: Instances in the order of keys, None for those not found
+        @rtype: List of model instances
+        @raise ValueError: Raised if a key is of a kind without a model class
+        """
+        keys_by_kind = {}
+        for key in keys:
+            keys_by_kind.setdefault(key.kind(), []).append(key)
+
+        # One call per class, each batched through the request, local and memcache layers
+        found = {}
+        for kind, kind_keys in keys_by_kind.items():
+            try:
+                model_class = db.class_for_kind(kind)
+            except db.KindError:
+                raise ValueError("Invalid kind " + kind)
+            found.update(zip(kind_keys, model_class.get(kind_keys)))
+
+        return map(lambda x: found[x], keys)
+
+    def __parse_key(self, encoded):
+        """
+        Converts an encoded key sent by the client
+
+        @param encoded: The string version of a key
+        @type encoded: String
+        @return: Decoded key
+        @rtype: Key
+        @raise ValueError: Raised if encoded is not a valid key
+        """
+        if not encoded:
+            raise ValueError("Missing key")
+
+        try:
+            return db.Key(encoded)
+        except (db.BadArgumentError, db.BadKeyError):
+            raise ValueError("Invalid key " + str(encoded))
@@ -1,33 +1,73 @@
+import itertools
+import json
 import logging
 import webapp2
 from google.appengine.api import users
+from google.appengine.ext import db
 from google.appengine.ext.db import Query
 from serialization import config_model
-from serialization import backends
-
-class GAEController(webapp2.RequestHandler):
+from serialization import dto
+from serialization.entity_cache import EntityCache
+from serialization.serializers import SerializerFactory
+from backends import platform_manager
+import batch
+
+class BaseHandler(webapp2.RequestHandler):
+    """ Base for the REST handlers with the actions and status codes they share """
+
+    ACTION_PARAM = "action"
+    POST = "POST"
+    PUT = "PUT"
+    DELETE = "DELETE"
+
+    OK = 200
+    CREATED = 201
+    UPDATED = 200
+    DELETED = 200
+    BAD_REQUEST = 400
+    FORBIDDEN = 403
+    METHOD_NOT_ALLOWED = 405
+
+    def dispatch(self):
+        """ Handles the request with a fresh identity map and shared cache generations read once """
+        entity_cache = EntityCache.get_instance()
+        uac_checker = platform_manager.PlatformManager.get_instance().get_uac_checker()
+        entity_cache.start_request()
+        uac_checker.start_request()
+        try:
+            webapp2.RequestHandler.dispatch(self)
+        finally:
+            entity_cache.end_request()
+            uac_checker.end_request()
+
+class GAEController(BaseHandler):
 
     DEFAULT_SERIALIZER = "complex-JSON"
     PROJECT_MODEL_NAME = "Project"
     PROJECT_ID_PARAM = "project_id"
     INSTANCE_ID_PARAM = "id"
     PARENT_PARAM = "parent"
+    SUBTREE_PARAM = "__subtree__"
+    LIMIT_PARAM = "__limit__"
+    CURSOR_PARAM = "__cursor__"
+    NEXT_CURSOR_HEADER = "X-Next-Cursor"
+    FIELDS_PARAM = "fields"
+    CHILDREN_PARAM = "children"
+    MAX_PAGE_SIZE = 100
 
     def __init__(self, target_class, *args, **kwargs):
-        webapp2.RequestHandler.__init__(self, *args, **kwargs)    
+        BaseHandler.__init__(self, *args, **kwargs)    
         
         model_factory = config_model.ConfigModelFactory.get_instance()
             
         self.__target_class = target_class
         self.__target_class_name = target_class.__name__
-        self.__target_class_defn = model_factory.get_class(self.__target_class_name)
-        self.__project_model = model_factory.get_class(GAEController.PROJECT_MODEL_NAME)
-        self.__uac_checker = backends.DatabaseManager.get_instance().get_uac_checker()
+        self.__target_class_defn = model_factory.get_class_definition(self.__target_class_name)
+        self.__project_model = model_factory.get_model(GAEController.PROJECT_MODEL_NAME)
+        self.__uac_checker = platform_manager.PlatformManager.get_instance().get_uac_checker()
 
     def get(self):
-        result = self.__do_get(self)
-        serializer = SerializerFactory.get_serializer(GAEController.DEFAULT_SERIALIZER)
-        self.response.out.write(serializer.dumps(result))
+        self.__do_get()
 
     def post(self):
         
@@ -41,24 +81,45 @@ class GAEController(webapp2.RequestHandler):
 
         # Switch on action
         if action == BaseHandler.POST:
-            result = self.__do_post()
+            self.__do_post()
         elif action == BaseHandler.PUT:
-            result = self.__do_put()
+            self.__do_put()
         elif action == BaseHandler.DELETE:
-            result = self.__do_delete()
+            self.__do_delete()
         else:
             self.error(BaseHandler.METHOD_NOT_ALLOWED)
-        
-        serializer = SerializerFactory.get_serializer("complex-JSON")
-        self.response.out.write(serializer.dumps(result))
 
     def __do_get(self):
-        arguments = self.arguments()
-
-        # TODO: Limit query by __limit__ argument
+        arguments = self.request.arguments()
 
         # Try to determine the project_id
         project = self.__get_project()
+        if project == None:
+            self.error(BaseHandler.METHOD_NOT_ALLOWED)
+            return
+
+        # Load the whole hierarchy under an instance in one response
+        if GAEController.SUBTREE_PARAM in arguments:
+            instance = self.__get_instance_by_id()
+            if instance == None:
+                self.error(BaseHandler.METHOD_NOT_ALLOWED)
+                return
+            if not self.__is_authorized(instance):
+                self.error(BaseHandler.FORBIDDEN)
+                return
+            self.__write_serialized_subtree(instance)
+            self.response.set_status(BaseHandler.OK)
+            return
+
+        # Determine which fields and whether children were asked for
+        fields = self.__target_class_defn.get_fields()
+        exposed_names = [name for name, field in fields.items() if field.is_exposed()]
+
+        selected_names = self.__get_selected_fields(exposed_names)
+        if selected_names == False:
+            self.error(BaseHandler.METHOD_NOT_ALLOWED)
+            return
+        include_children = self.__get_include_children(selected_names)
 
         # See if we can short-cut by looking up using an ID
         if GAEController.INSTANCE_ID_PARAM in arguments:
@@ -70,41 +131,146 @@ class GAEController(webapp2.RequestHandler):
 
         # If not, build a query from the given parameters
         else:
-            fields = self.__target_class_defn.get_fields()
+            filter_names = filter(lambda x: x in arguments, exposed_names)
 
             # NOTE: Query class handles sql injection
-            query = Query(self.__target_class)
+            projection = self.__get_projection(fields, selected_names, filter_names)
+            query = Query(self.__target_class, projection=projection)
 
             # Build query with filters
-            for field_name in filter(lambda x: x.is_exposed(), fields.keys()):
+            for field_name in filter_names:
+                query.filter(field_name + " =", self.request.get(field_name))
 
-                if field_name in arguments:
-                    query.filter(field_name + " =", self.get(field_name))
-            
-            instances = list(query)
+            # Only read one page, picking up where the client's cursor left off
+            page_size = self.__get_page_size()
+            if page_size == None:
+                self.error(BaseHandler.BAD_REQUEST)
+                return
+
+            # Malformed cursors fail here, ones from a different query when the page is read
+            cursor = self.request.get(GAEController.CURSOR_PARAM, None)
+            try:
+                if cursor:
+                    query.with_cursor(cursor)
+                instances = self.__read_page(query, page_size)
+            except (db.BadValueError, db.BadRequestError):
+                self.error(BaseHandler.BAD_REQUEST)
+                logging.debug("Request reject b/c invalid cursor")
+                return
         
+        # Check security for the whole page at once
+        mask = self.__uac_checker.is_authorized_many(instances, users.get_current_user())
+        authorized = [instance for instance, allowed in zip(instances, mask) if allowed]
+
         # Write out response for 
-        check_security = lambda x: self.__is_authorized(x)
-        self.__write_seralized_response(filter(check_security, instances))
+        self.__write_serialized_response(
+            authorized,
+            many=True,
+            fields=selected_names,
+            include_children=include_children
+        )
+
+        self.response.set_status(BaseHandler.OK)
+
+    def __get_selected_fields(self, exposed_names):
+        """ Get the exposed fields named in FIELDS_PARAM, None if not given, or False if invalid """
+        selection = self.request.get(GAEController.FIELDS_PARAM, None)
+        if not selection:
+            return None
+
+        selected_names = selection.split(",")
+        for field_name in selected_names:
+            if not field_name in exposed_names:
+                logging.debug("Request reject b/c unknown field " + field_name)
+                return False
+
+        return selected_names
+
+    def __get_include_children(self, selected_names):
+        """ Determine if children were asked for, which they are by default unless fields are selected """
+        if GAEController.CHILDREN_PARAM in self.request.arguments():
+            return self.request.get(GAEController.CHILDREN_PARAM) in ("1", "true")
+        return selected_names == None
+
+    def __get_projection(self, fields, selected_names, filter_names):
+        """
+        Get the properties to project the query on or None to load whole entities
+
+        Only a single indexed field without filters is projected since that is
+        served by its built-in index. Any other combination would need a composite
+        index that index.yaml only has if someone ran it on the dev server.
+        """
+        if selected_names == None or len(selected_names) != 1 or filter_names:
+            return None
 
-        self.set_status(BaseHandler.OK)
+        if not fields[selected_names[0]].get_field_type().is_projectable():
+            return None
+
+        return tuple(selected_names)
+
+    def __get_page_size(self):
+        """ Get the number of results to return, capped at MAX_PAGE_SIZE, or None if invalid """
+        limit = self.request.get(GAEController.LIMIT_PARAM, None)
+        if not limit:
+            return GAEController.MAX_PAGE_SIZE
+
+        try:
+            limit = int(limit)
+        except ValueError:
+            logging.debug("Request reject b/c invalid limit")
+            return None
+
+        if limit < 1:
+            logging.debug("Request reject b/c invalid limit")
+            return None
+
+        return min(limit, GAEController.MAX_PAGE_SIZE)
+
+    def __read_page(self, query, page_size):
+        """
+        Reads up to page_size results from query
+
+        One result past the page is fetched so the cursor for the following page
+        is only reported in the NEXT_CURSOR_HEADER header when there are more results
+        """
+        results = iter(query.run(limit=page_size + 1))
+        page = list(itertools.islice(results, page_size))
+
+        # The cursor is after the last result read, so take it before reading past the page
+        cursor = query.cursor()
+        if next(results, None) != None:
+            self.response.headers[GAEController.NEXT_CURSOR_HEADER] = str(cursor)
+
+        return page
 
     def __is_authorized(self, target):
         """ Checks to see if the current user can operate on target """
         user = users.get_current_user()
-        return self.__uac_checker.is_authorized(x, user)
+        return self.__uac_checker.is_authorized(target, user)
     
     def __get_project(self):
-        """ Get the project referenced by this REST API call """
-        if not GAEController.PROJECT_ID_PARAM in self.arguments():
-            self.error(BaseHandler.METHOD_NOT_ALLOWED)
+        """ Get the project referenced by this REST API call or None if missing or invalid """
+        project_id = self.request.get(GAEController.PROJECT_ID_PARAM, None)
+        if not project_id:
             logging.debug("Request reject b/c missing project_id")
-        return self.__project_model.get_by_id(GAEController.PROJECT_ID_PARAM)
+            return None
+
+        try:
+            return self.__project_model.get_by_id(int(project_id))
+        except ValueError:
+            logging.debug("Request reject b/c invalid project_id")
+            return None
     
     def __get_instance_by_id(self):
-        if GAEController.INSTANCE_ID_PARAM in self.arguments():
-            return self.__target_class.get_by_id(int(self.get(GAEController.INSTANCE_ID_PARAM)))
-        else:
+        """ Get the instance named by INSTANCE_ID_PARAM or None if missing or invalid """
+        instance_id = self.request.get(GAEController.INSTANCE_ID_PARAM, None)
+        if not instance_id:
+            return None
+
+        try:
+            return self.__target_class.get_by_id(int(instance_id))
+        except ValueError:
+            logging.debug("Request reject b/c invalid id")
             return None
 
     def __do_post(self):
@@ -121,49 +287,124 @@ class GAEController(webapp2.RequestHandler):
             return
 
         fields = self.__target_class_defn.get_fields()
+        arguments = self.request.arguments()
 
         # Make changes
-        for field_name in filter(lambda x: x.is_exposed(), fields.keys()):
+        for field_name in filter(lambda x: fields[x].is_exposed(), fields.keys()):
 
             if field_name in arguments:
-                new_val_raw = self.get(field_name)
-                new_val = self.__interpret_foreign_value(field_name, new_val_raw)
+                new_val_raw = self.request.get(field_name)
+                try:
+                    new_val = self.__interpret_foreign_value(field_name, new_val_raw)
+                except ValueError, e:
+                    self.error(BaseHandler.METHOD_NOT_ALLOWED)
+                    logging.debug("Request reject b/c " + str(e))
+                    return
                 setattr(instance, field_name, new_val)
         
         # Save back
         instance.put()
 
         # Report on success
-        self.__write_seralized_response(instance)
-        self.set_status(BaseHandler.UPDATED)
+        self.__write_serialized_response(instance)
+        self.response.set_status(BaseHandler.UPDATED)
 
     def __do_put(self):
 
         fields = self.__target_class_defn.get_fields()
         field_vals = {}
 
-        arguments = self.arguments()
+        arguments = self.request.arguments()
 
         # Determine parent
-        if not GAEController.PARENT_PARAM:
+        if not GAEController.PARENT_PARAM in arguments:
             self.error(BaseHandler.METHOD_NOT_ALLOWED)
             return
 
-        parent_id = self.get(GAEController.PARENT_PARAM)
-        parent = self.__interpret_foreign_value(GAEController.PARENT_PARAM, parent_id)
+        try:
+            parent_id = self.request.get(GAEController.PARENT_PARAM)
+            parent = self.__interpret_foreign_value(GAEController.PARENT_PARAM, parent_id)
 
-        # Make changes
-        for field_name in filter(lambda x: x.is_exposed(), fields.keys()):
+            # Make changes
+            for field_name in filter(lambda x: fields[x].is_exposed(), fields.keys()):
+
+                if field_name in arguments:
+                    new_val_raw = self.request.get(field_name)
+                    new_val = self.__interpret_foreign_value(field_name, new_val_raw)
+                    field_vals[field_name] = new_val
+        except ValueError, e:
+            self.error(BaseHandler.METHOD_NOT_ALLOWED)
+            logging.debug("Request reject b/c " + str(e))
+            return
+
+        # Check authorization against the entity the new instance is created under
+        if not self.__is_authorized(parent):
+            self.error(BaseHandler.FORBIDDEN)
+            return
 
-            if field_name in arguments:
-                new_val_raw = self.get(field_name)
-                new_val = self.__interpret_foreign_value(field_name, new_val_raw)
-                field_vals[field_name] = new_val
-        
         instance = self.__target_class(parent=parent, **field_vals)
-        self.set_status(BaseHandler.CREATED)
+        instance.put()
+
+        self.response.set_status(BaseHandler.CREATED)
         self.__write_serialized_response(instance)
 
+    def __interpret_foreign_value(self, field_name, value):
+        """
+        Converts a request parameter to the value stored in the given field
+
+        @param field_name: The name of the exposed field or PARENT_PARAM
+        @type field_name: String
+        @param value: The raw value sent by the client, an encoded key for references
+        @type value: String
+        @return: The value to store in the field, or the loaded parent for PARENT_PARAM
+        @rtype: Any
+        @raise ValueError: Raised if value can not be stored in the field
+        """
+        if field_name == GAEController.PARENT_PARAM:
+            parent_key = self.__parse_key(value)
+            parent = db.get(parent_key)
+            if parent == None:
+                raise ValueError("No entity found for " + value)
+            return parent
+
+        model_property = getattr(self.__target_class, field_name)
+        field = self.__target_class_defn.get_fields()[field_name]
+
+        if field.get_field_type().is_reference():
+            if not value:
+                return None
+
+            # Keys are stored as is so the referenced entity is never loaded.
+            # Reference types are named after the class they point to.
+            value = self.__parse_key(value)
+            model_factory = config_model.ConfigModelFactory.get_instance()
+            referenced_class = model_factory.get_model(field.get_field_type_name())
+            try:
+                if not issubclass(db.class_for_kind(value.kind()), referenced_class):
+                    raise ValueError("Invalid kind " + value.kind() + " for " + field_name)
+            except db.KindError:
+                raise ValueError("Invalid kind " + value.kind() + " for " + field_name)
+            return value
+
+        try:
+            if model_property.data_type == bool:
+                value = value in ("1", "true")
+            elif model_property.data_type in (int, long, float):
+                value = model_property.data_type(value)
+            return model_property.validate(value)
+        except db.BadValueError, e:
+            raise ValueError("Invalid value for " + field_name + ": " + str(e))
+
+    def __parse_key(self, encoded):
+        """ Decodes a key sent by the client, raising ValueError if missing or invalid """
+        if not encoded:
+            raise ValueError("Missing key")
+
+        try:
+            return db.Key(encoded)
+        except (db.BadArgumentError, db.BadKeyError):
+            raise ValueError("Invalid key " + encoded)
+
     def __do_delete(self):
         
         # Get the instance
@@ -184,7 +425,68 @@ class GAEController(webapp2.RequestHandler):
         instance.delete()
 
         # Confirm
-        self.set_status(BaseHandler.DELETED)
+        self.response.set_status(BaseHandler.DELETED)
     
-    def __write_serialized_response(self, target):
-        pass
+    def __write_serialized_response(self, target, many=False, fields=None, include_children=True):
+        """
+        Writes out the DTO for target or, if many, the DTO of each instance in target
+
+        DTOs are created and written one at a time so only one is ever held in memory.
+        webapp2 buffers response.out until the handler returns, so this bounds memory
+        but does not send anything to the client any earlier.
+        """
+        builder = dto.DTOBuilder.get_instance()
+        serializer = SerializerFactory.get_serializer(GAEController.DEFAULT_SERIALIZER)
+        self.response.headers["Content-Type"] = serializer.get_content_type()
+
+        create_dto = lambda x: builder.create_dto(x, fields=fields, include_children=include_children)
+
+        if many:
+            serializer.dump_all(itertools.imap(create_dto, target), self.response.out)
+        else:
+            serializer.dump(create_dto(target), self.response.out)
+
+    def __write_serialized_subtree(self, root):
+        """ Writes out root with all of its descendants nested inside """
+        subtree_dto = dto.DTOBuilder.get_instance().create_subtree_dto(root)
+        serializer = SerializerFactory.get_serializer(GAEController.DEFAULT_SERIALIZER)
+        self.response.headers["Content-Type"] = serializer.get_content_type()
+        serializer.dump(subtree_dto, self.response.out)
+
+
+class GAEBatchController(BaseHandler):
+    """ Controller that applies a list of operations across model classes in one request """
+
+    def __init__(self, *args, **kwargs):
+        BaseHandler.__init__(self, *args, **kwargs)
+
+        uac_checker = platform_manager.PlatformManager.get_instance().get_uac_checker()
+        self.__processor = batch.GAEBatchProcessor(uac_checker)
+
+    def post(self):
+
+        # Validate and read everything being changed
+        try:
+            operations = self.__processor.parse(json.loads(self.request.body))
+            self.__processor.load(operations)
+        except ValueError, e:
+            self.error(BaseHandler.METHOD_NOT_ALLOWED)
+            logging.debug("Batch reject b/c " + str(e))
+            return
+
+        # Check authorization once per entity group
+        if not self.__processor.is_authorized(operations, users.get_current_user()):
+            self.error(BaseHandler.FORBIDDEN)
+            return
+
+        # Save back
+        saved = self.__processor.commit(operations)
+
+        # Report on success
+        builder = dto.DTOBuilder.get_instance()
+        serializer = SerializerFactory.get_serializer(GAEController.DEFAULT_SERIALIZER)
+        self.response.headers["Content-Type"] = serializer.get_content_type()
+
+        create_dto = lambda x: builder.create_dto(x, include_children=False)
+        serializer.dump_all(itertools.imap(create_dto, saved), self.response.out)
+        self.response.set_status(BaseHandler.UPDATED)
@@ -3,13 +3,21 @@ Adaptable model that fills in the gaps for the backend in use
 """
 
 try:
+    from google.appengine.api import memcache
+    from google.appengine.datastore import entity_pb
     from google.appengine.ext import db
     from google.appengine.ext.db import Query
 except ImportError:
     # dont fail for on-the-ground testing
+    memcache = None
+    entity_pb = None
     db = None
     Query = None
 
+import time
+
+from entity_cache import EntityCache
+
 # TODO: Fully unified interface for adaptable models . . . see backends.DatabaseManager
 
 class GAEAdaptedModel(db.Model):
@@ -17,6 +25,218 @@ class GAEAdaptedModel(db.Model):
     Model that fills in database-specific gaps in GAE implementation
     """
 
+    CHILDREN_BATCH_SIZE = 100
+
+    # Seconds to keep instances of this class in memcache, None to not cache.
+    # Set per class through the __cache_ttl__ option in the model config files.
+    CACHE_TTL = None
+    ENTITY_CACHE_PREFIX = "entity:"
+    CHILDREN_CACHE_PREFIX = "children:"
+
+    # Bumped on writes under a parent so children lists read before the write are not used
+    CHILDREN_GENERATION_PREFIX = "children_generation:"
+
+    # Bumped in memcache on writes to cached classes so every instance drops its local copies
+    ENTITY_GENERATION_KEY = "entity_generation"
+
+    # Kind names mapped to functions called with the keys of written entities
+    __write_listeners = {}
+
+    @classmethod
+    def add_write_listener(cls, kind, listener):
+        """
+        Registers a function to be told when entities of the given kind are written or deleted
+
+        @param kind: The name of the model class to listen to
+        @type kind: String
+        @param listener: Function taking the list of keys that changed
+        @type listener: Callable
+        """
+        GAEAdaptedModel.__write_listeners.setdefault(kind, []).append(listener)
+
+    @classmethod
+    def get(cls, keys, **kwargs):
+        """
+        Get instances of this class by key
+
+        Each key is only fetched once per request. Classes with a CACHE_TTL also
+        read through the in-process entity cache and then memcache.
+
+        @param keys: Key, encoded key, or list of them to look up
+        @type keys: Key, String, or List
+        @return: Instance or list of instances (None for those not found)
+        @rtype: Model instance or List
+        """
+        entity_cache = EntityCache.get_instance()
+
+        multiple = isinstance(keys, (list, tuple))
+        if not multiple:
+            keys = [keys]
+        keys = map(lambda x: db.Key(x) if isinstance(x, basestring) else x, keys)
+        cache_keys = map(str, keys)
+
+        # Check what was already loaded this request
+        found = {}
+        for cache_key in cache_keys:
+            instance = entity_cache.get_request_instance(cache_key)
+            if isinstance(instance, cls):
+                found[cache_key] = instance
+        missing = filter(lambda x: not str(x) in found, keys)
+
+        if missing and cls.CACHE_TTL == None:
+            loaded = super(GAEAdaptedModel, cls).get(missing, **kwargs)
+            found.update(zip(map(str, missing), loaded))
+
+        elif missing:
+            encoded = {}
+
+            # Pick up writes made on other instances once per request
+            if entity_cache.needs_generation():
+                entity_cache.set_generation(memcache.get(GAEAdaptedModel.ENTITY_GENERATION_KEY) or 0)
+
+            # In-process cache then memcache
+            for key in missing:
+                entry = entity_cache.get(str(key))
+                if entry != None:
+                    encoded[str(key)] = entry
+            missing = filter(lambda x: not str(x) in encoded, missing)
+
+            if missing:
+                from_memcache = memcache.get_multi(map(str, missing), key_prefix=GAEAdaptedModel.ENTITY_CACHE_PREFIX)
+                for cache_key, entry in from_memcache.items():
+                    entity_cache.set(cache_key, entry, cls.CACHE_TTL)
+                encoded.update(from_memcache)
+                missing = filter(lambda x: not str(x) in encoded, missing)
+
+            # Go to the datastore for the rest
+            if missing:
+                loaded = super(GAEAdaptedModel, cls).get(missing, **kwargs)
+
+                to_cache = {}
+                for key, instance in zip(missing, loaded):
+                    if instance != None:
+                        to_cache[str(key)] = GAEAdaptedModel.__encode(instance)
+                        entity_cache.set(str(key), to_cache[str(key)], cls.CACHE_TTL)
+                    found[str(key)] = instance
+                memcache.set_multi(to_cache, time=cls.CACHE_TTL, key_prefix=GAEAdaptedModel.ENTITY_CACHE_PREFIX)
+
+            for cache_key, entry in encoded.items():
+                found[cache_key] = GAEAdaptedModel.__decode(entry)
+
+        # Remember for the rest of the request
+        for cache_key, instance in found.items():
+            if instance != None:
+                entity_cache.set_request_instance(cache_key, instance)
+
+        instances = map(lambda x: found.get(x, None), cache_keys)
+
+        if multiple:
+            return instances
+        return instances[0]
+
+    @classmethod
+    def get_by_id(cls, ids, parent=None, **kwargs):
+        """
+        Get instances of this class by id through the same caches as get
+
+        @param ids: Numeric id or list of ids to look up
+        @type ids: int or List of ints
+        @keyword parent: Parent model or key of the instances. Defaults to None.
+        @type parent: Model instance or Key
+        @return: Instance or list of instances (None for those not found)
+        @rtype: Model instance or List
+        """
+        if isinstance(parent, db.Model):
+            parent = parent.key()
+
+        to_key = lambda x: db.Key.from_path(cls.kind(), x, parent=parent)
+        if isinstance(ids, (list, tuple)):
+            return cls.get(map(to_key, ids), **kwargs)
+        return cls.get(to_key(ids), **kwargs)
+
+    @classmethod
+    def put_many(cls, instances):
+        """
+        Saves many instances in one datastore call, clearing their cached copies
+
+        @param instances: The instances to save
+        @type instances: List of Model instances
+        @return: Keys of the saved instances
+        @rtype: List of Keys
+        """
+        keys = db.put(instances)
+        GAEAdaptedModel.invalidate_cache(keys)
+        return keys
+
+    @classmethod
+    def delete_many(cls, keys):
+        """
+        Deletes many instances in one datastore call, clearing their cached copies
+
+        @param keys: Keys of the instances to delete
+        @type keys: List of Keys
+        """
+        db.delete(keys)
+        GAEAdaptedModel.invalidate_cache(keys)
+
+    @classmethod
+    def invalidate_cache(cls, keys):
+        """
+        Clears the cached copies of the given entities and the children lists they appear in
+
+        @param keys: Keys of the entities that changed
+        @type keys: List of Keys
+        """
+        cache_keys = []
+        generation_keys = {}
+        EntityCache.get_instance().invalidate(map(str, keys))
+
+        for key in keys:
+            cache_keys.append(GAEAdaptedModel.ENTITY_CACHE_PREFIX + str(key))
+
+            # Children queries match every descendant so outdate the list of each ancestor.
+            # Only lists of cached classes are kept.
+            if not GAEAdaptedModel.__is_cached_kind(key.kind()):
+                continue
+            ancestor = key.parent()
+            while ancestor != None:
+                generation_key = GAEAdaptedModel.__get_children_generation_key(ancestor, key.kind())
+                generation_keys[generation_key] = 1
+                ancestor = ancestor.parent()
+
+        memcache.delete_multi(cache_keys)
+        if generation_keys:
+            memcache.offset_multi(generation_keys, initial_value=GAEAdaptedModel.__new_generation())
+
+        # Have other instances drop their local copies of cached classes
+        if filter(lambda x: GAEAdaptedModel.__is_cached_kind(x.kind()), keys):
+            memcache.incr(GAEAdaptedModel.ENTITY_GENERATION_KEY, initial_value=0)
+
+        # Let others know about the changes
+        for kind, listeners in GAEAdaptedModel.__write_listeners.items():
+            changed = filter(lambda x: x.kind() == kind, keys)
+            if changed:
+                for listener in listeners:
+                    listener(changed)
+
+    def put(self, **kwargs):
+        """
+        Saves this instance, clearing its cached copies
+
+        @return: Key of this instance
+        @rtype: Key
+        """
+        key = super(GAEAdaptedModel, self).put(**kwargs)
+        GAEAdaptedModel.invalidate_cache([key])
+        EntityCache.get_instance().set_request_instance(str(key), self)
+        return key
+
+    def delete(self, **kwargs):
+        """ Deletes this instance, clearing its cached copies """
+        key = self.key()
+        super(GAEAdaptedModel, self).delete(**kwargs)
+        GAEAdaptedModel.invalidate_cache([key])
+
     def get_children(self, child_class, **kwargs):
         """ 
         Get all of the children of this model
@@ -31,12 +251,66 @@ class GAEAdaptedModel(db.Model):
         query.ancestor(self)
 
         for arg in kwargs.items():
-            query.filter(arg(0) + " =", arg(1))
+            query.filter(arg[0] + " =", arg[1])
 
         # TODO: Ensure only immediate children
 
         return query
+
+    def get_children_async(self, child_class, **kwargs):
+        """
+        Start fetching the children of this model without waiting on the datastore
+
+        @param child_class: The child class to look for children in
+        @type child_class: Any model instance
+        @return: Iterator over this model's children that fills in the background
+        @rtype: Iterator
+        """
+        query = self.get_children(child_class, **kwargs)
+
+        # Only unfiltered lists of cached classes are kept in memcache
+        if kwargs or child_class.CACHE_TTL == None:
+            return query.run(batch_size=GAEAdaptedModel.CHILDREN_BATCH_SIZE)
+
+        cache_key = GAEAdaptedModel.__get_children_cache_key(self.key(), child_class.kind())
+        generation_key = GAEAdaptedModel.__get_children_generation_key(self.key(), child_class.kind())
+        cached = memcache.get_multi([cache_key, generation_key])
+
+        # Lists are stored with the generation read before their query ran
+        generation = cached.get(generation_key, None)
+        entry = cached.get(cache_key, None)
+        if generation != None and isinstance(entry, tuple) and entry[0] == generation:
+            return iter(map(GAEAdaptedModel.__decode, entry[1]))
+
+        if generation == None:
+            generation = GAEAdaptedModel.__new_generation()
+            if not memcache.add(generation_key, generation):
+                generation = memcache.get(generation_key)
+
+        # Hand back the running query so it overlaps with others, caching once it is read
+        results = query.run(batch_size=GAEAdaptedModel.CHILDREN_BATCH_SIZE)
+        if generation == None:
+            return results
+        return GAEAdaptedModel.__cache_children(results, cache_key, generation, child_class.CACHE_TTL)
     
+    def get_parent_key(self):
+        """
+        Get the key of the model this model was created under
+
+        @return: Key of this instance's parent or None if this is a root
+        @rtype: Key
+        """
+        return self.parent_key()
+
+    def get_key_string(self):
+        """
+        Get an encoded version of this model's key that can be sent to clients
+
+        @return: Encoded key that identifies this instance across model classes
+        @rtype: String
+        """
+        return str(self.key())
+
     def get_id(self):
         """
         Get model specific id global to the application
@@ -46,3 +320,109 @@ class GAEAdaptedModel(db.Model):
         @rtype: int
         """
         return self.key().id()
+
+    @classmethod
+    def __is_cached_kind(cls, kind):
+        """
+        Determines if instances of the given kind are kept in the entity caches
+
+        @param kind: The name of the model class
+        @type kind: String
+        @return: True if the class has a CACHE_TTL and False otherwise
+        @rtype: Boolean
+        """
+        try:
+            model_class = db.class_for_kind(kind)
+        except db.KindError:
+            return False
+        return getattr(model_class, "CACHE_TTL", None) != None
+
+    @classmethod
+    def __get_children_cache_key(cls, parent_key, kind):
+        """
+        Get the memcache key for the children of the given kind under parent_key
+
+        @param parent_key: Key of the parent the children were queried under
+        @type parent_key: Key
+        @param kind: The kind of children
+        @type kind: String
+        @return: Memcache key for the children list
+        @rtype: String
+        """
+        return GAEAdaptedModel.CHILDREN_CACHE_PREFIX + str(parent_key) + ":" + kind
+
+    @classmethod
+    def __get_children_generation_key(cls, parent_key, kind):
+        """
+        Get the memcache key for the generation of the children of the given kind under parent_key
+
+        @param parent_key: Key of the parent the children were queried under
+        @type parent_key: Key
+        @param kind: The kind of children
+        @type kind: String
+        @return: Memcache key for the children generation
+        @rtype: String
+        """
+        return GAEAdaptedModel.CHILDREN_GENERATION_PREFIX + str(parent_key) + ":" + kind
+
+    @classmethod
+    def __new_generation(cls):
+        """
+        Get a starting value for a generation that was evicted or never set
+
+        @note: Based on the time so it does not repeat a value a list was stored with
+               before the generation was evicted
+        @return: New generation
+        @rtype: int
+        """
+        return int(time.time() * 1000)
+
+    @classmethod
+    def __cache_children(cls, results, cache_key, generation, ttl):
+        """
+        Passes along children from a running query, saving them to memcache once all are read
+
+        @param results: Iterator over the running children query
+        @type results: Iterator
+        @param cache_key: Memcache key for the children list
+        @type cache_key: String
+        @param generation: Generation of the children read before the query ran. A write
+                           while the query is read bumps it, so this list is not used.
+        @type generation: int
+        @param ttl: Seconds to keep the list in memcache
+        @type ttl: int
+        @return: Iterator over the children
+        @rtype: Iterator
+        """
+        children = []
+        for instance in results:
+            children.append(instance)
+            yield instance
+
+        memcache.set(cache_key, (generation, map(GAEAdaptedModel.__encode, children)), time=ttl)
+
+    @classmethod
+    def __encode(cls, instance):
+        """
+        Serializes instance to its protocol buffer form for memcache
+
+        @param instance: The instance to serialize
+        @type instance: Model instance
+        @return: Encoded entity
+        @rtype: String
+        """
+        return db.model_to_protobuf(instance).Encode()
+
+    @classmethod
+    def __decode(cls, encoded):
+        """
+        Restores an instance from its protocol buffer form
+
+        @param encoded: The encoded entity or None
+        @type encoded: String
+        @return: Model instance or None if encoded is None
+        @rtype: Model instance
+        """
+        if encoded == None:
+            return None
+        return db.model_from_protobuf(entity_pb.EntityProto(encoded))
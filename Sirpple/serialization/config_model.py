@@ -27,6 +27,7 @@ class ConfigModelFactory:
         """
         Constructor for ConfigModelFactory that lazily loads class constants
         """
+        self.__schema_version = 0
         self.reset()
         default_class = backends.platform_manager.PlatformManager.get_instance().get_default_base_class()
         ConfigModelFactory.DEFAULT_PARENT_CLASS_DEFINTION = model_spec.WrappedClassDefinition(default_class, [], None) # TODO: Parent field name?
@@ -39,6 +40,7 @@ class ConfigModelFactory:
 
         self.__class_definitions = {}
         self.__property_definitions = {}
+        self.__schema_version += 1
 
     def add_class_definitions(self, class_definitions):
         """
@@ -48,6 +50,7 @@ class ConfigModelFactory:
         @type class_definitions: Dictionary from String to ClassDefinition
         """
         self.__class_definitions.update(class_definitions)
+        self.__schema_version += 1
     
     def add_property_definitions(self, property_definitions):
         """
@@ -57,6 +60,17 @@ class ConfigModelFactory:
         @type property_definitions: Dictionary from String to PropertyDefinition
         """
         self.__property_definitions.update(property_definitions)
+        self.__schema_version += 1
+
+    def get_schema_version(self):
+        """
+        Gets a number identifying the current state of the loaded schema
+
+        @note: Changes every time class or property definitions are added or reset
+        @return: Version that increases with each change to this factory's definitions
+        @rtype: int
+        """
+        return self.__schema_version
     
     def get_class_definition(self, name):
         """
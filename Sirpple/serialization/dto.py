@@ -1,13 +1,20 @@
 """ Mechanisms for supporting data transfer objects """
 
+try:
+    from google.appengine.ext import db
+except ImportError:
+    # dont fail for on-the-ground testing
+    db = None
+
 import logging
-import type_converters
 import model_graph
 
 class DTOBuilder:
     """ Builder that produces and reads data transfer objects """
 
     CLASS_IDENTIFIER = "__class__"
+    ID_IDENTIFIER = "__id__"
+    KEY_IDENTIFIER = "__key__"
     CHILDREN_PREFIX = "children_"
 
     __instance = None
@@ -20,22 +27,28 @@ class DTOBuilder:
         @return: Shared DTOFactory instance
         @rtype: DTOFactory
         """
-        if DTOFactory.__instance == None:
-            DTOFactory.__instance = DTOFactory()
+        if DTOBuilder.__instance == None:
+            DTOBuilder.__instance = DTOBuilder()
         
-        return DTOFactory.__instance
+        return DTOBuilder.__instance
     
-    def create_dto(self, target):
+    def create_dto(self, target, children=None, fields=None, include_children=True):
         """
         Creates a new data transfer object (dict) from the given target
 
         @param target: Instance of class loaded from configuration files
         @type target: Python native instance
-        @return: Organized contents of target including ids of children
+        @keyword children: Already loaded children of target by type. If None,
+                           the children are fetched. Defaults to None.
+        @type children: Dictionary of ClassDefinitions to Model instances
+        @keyword fields: Names of the exposed fields to include. If None, include
+                         all exposed fields. Defaults to None.
+        @type fields: List of Strings
+        @keyword include_children: If True, include the keys of children. Defaults to True.
+        @type include_children: Boolean
+        @return: Organized contents of target including the keys of references and children
         @rtype: Dictionary
         """
-        converter = type_converters.TypeConverter.get_instance()
-
         graph = model_graph.ModelGraph.get_current_graph()
 
         class_name = target.__class__.__name__
@@ -43,23 +56,72 @@ class DTOBuilder:
 
         ret_dict = {}
 
-        # Include class name
+        # Include class name, id and key
         ret_dict[DTOBuilder.CLASS_IDENTIFIER] = class_name
+        ret_dict[DTOBuilder.ID_IDENTIFIER] = target.get_id()
+        ret_dict[DTOBuilder.KEY_IDENTIFIER] = target.get_key_string()
 
         # Handle basic attributes
-        for field in filter(lambda x: x.is_exposed(), class_definition.get_fields()):
+        for field in filter(lambda x: x.is_exposed(), class_definition.get_fields().values()):
             field_name = field.get_name()
-            ret_dict[field_name] = getattr(target, field_name)
+            if fields == None or field_name in fields:
+
+                # Read the stored key of references so the referenced entity is not fetched
+                if field.get_field_type().is_reference():
+                    model_property = getattr(target.__class__, field_name)
+                    ret_dict[field_name] = model_property.get_value_for_datastore(target)
+                else:
+                    ret_dict[field_name] = getattr(target, field_name)
         
+        if not include_children:
+            return ret_dict
+
         # Handle children
-        children = graph.get_children(target)
+        if children == None:
+            children = graph.get_children(target)
         
         # Fill in the children instances
-        for defn, instance in children.items():
-            pointers = map(lambda x: converter.convert_for_dto(x.__class__.__name__, x))
+        for defn, instances in children.items():
+            pointers = map(lambda x: x.get_key_string(), instances)
             ret_dict[DTOBuilder.CHILDREN_PREFIX + defn.get_name().lower()] = pointers
         
         return ret_dict
+
+    def create_subtree_dto(self, root):
+        """
+        Creates a data transfer object for root with all of its descendants nested inside
+
+        @param root: Instance of class loaded from configuration files
+        @type root: Python native instance
+        @return: Organized contents of root with the DTOs of children in place of their ids
+        @rtype: Dictionary
+        """
+        graph = model_graph.ModelGraph.get_current_graph()
+        subtree = graph.get_subtree(root)
+        return self.__create_nested_dto(root, graph, subtree)
+
+    def __create_nested_dto(self, target, graph, subtree):
+        """
+        Creates a data transfer object for target out of an already loaded subtree
+
+        @param target: Instance of class loaded from configuration files
+        @type target: Python native instance
+        @param graph: The graph the subtree was loaded through
+        @type graph: ModelGraph
+        @param subtree: Children by parent key as produced by ModelGraph.get_subtree
+        @type subtree: Dictionary of Keys to Dictionary of ClassDefinitions to Model instances
+        @return: Organized contents of target with nested children
+        @rtype: Dictionary
+        """
+        ret_dict = self.create_dto(target, {})
+
+        children = subtree.get(target.key(), {})
+        for defn in graph.get_children_classes(target.__class__):
+            instances = children.get(defn, [])
+            nested = map(lambda x: self.__create_nested_dto(x, graph, subtree), instances)
+            ret_dict[DTOBuilder.CHILDREN_PREFIX + defn.get_name().lower()] = nested
+        
+        return ret_dict
     
     def read_dto(self, source, class_definition, target=None):
         """
@@ -80,34 +142,43 @@ class DTOBuilder:
         # issues for other backends?
 
         # Get actual class
-        target_class = class_defn.get_class()
+        target_class = class_definition.get_class()
 
         # Get field definitions from class defintion
         field_definitions = class_definition.get_fields()
 
-        # Create structue to hold cleaned fields
-        cleaned_foreign_entries = {}
-
         # If we are writing into a new instance, create temp dict
         if target == None:
             target_dict = {}
 
         # Clean and check for editing non-exposed fields
-        for foreign_field, foreign_value in source:
+        for foreign_field, foreign_value in source.items():
+
+            # Identifiers and children written by create_dto are not fields
+            if foreign_field in (DTOBuilder.CLASS_IDENTIFIER, DTOBuilder.ID_IDENTIFIER, DTOBuilder.KEY_IDENTIFIER):
+                continue
+            if foreign_field.startswith(DTOBuilder.CHILDREN_PREFIX):
+                continue
 
             # Check that the field is available
-            if not foriegn_field in field_definitions:
-                logging.error("Invalid field " + foreign_field + " passed to " + target_class.get_name())
+            if not foreign_field in field_definitions:
+                logging.error("Invalid field " + foreign_field + " passed to " + class_definition.get_name())
                 return None
             
             # Check that the field is exposed
-            field_defintion = field_defintions[foreign_field]
+            field_definition = field_definitions[foreign_field]
             if not field_definition.is_exposed():
-                logging.error("Attempted to write non-exposed field " + field_defintion.get_name() + " for " + target_class.get_name() + " through REST API")
+                logging.error("Attempted to write non-exposed field " + field_definition.get_name() + " for " + class_definition.get_name() + " through REST API")
+                return None
             
-            # Convert and clean
-            type_name = field_definition.get_field_type_name()
-            new_value = converter.convert_from_dto(type_name, source)
+            # References are sent as the encoded keys create_dto writes
+            new_value = foreign_value
+            if field_definition.get_field_type().is_reference() and foreign_value != None:
+                try:
+                    new_value = db.Key(foreign_value)
+                except (db.BadArgumentError, db.BadKeyError):
+                    logging.error("Invalid key " + str(foreign_value) + " passed to " + class_definition.get_name())
+                    return None
         
             # If we are writing into an existing instance
             if target:
@@ -119,6 +190,6 @@ class DTOBuilder:
         
         # Create instance if necessary
         if target == None:
-            return target_class(target_dict) # TODO: Non-GAE / Django backends?
+            return target_class(**target_dict) # TODO: Non-GAE / Django backends?
         else:
             return target
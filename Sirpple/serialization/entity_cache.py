@@ -0,0 +1,212 @@
+"""
+In-process caching of entities for the lifetime of a request and across requests
+"""
+
+import collections
+import threading
+import time
+
+class EntityCache:
+    """
+    Per-request identity map backed by a bounded, process-wide LRU of encoded entities
+
+    The identity map guarantees a key is only fetched once per request and
+    always resolves to the same instance. The LRU keeps encoded copies between
+    requests for at most MAX_LOCAL_TTL seconds and is cleared whenever the
+    generation shared by every instance moves on.
+    """
+
+    MAX_ENTRIES = 1000
+
+    # Entities written by other instances may take this long to be seen locally
+    MAX_LOCAL_TTL = 5
+
+    __instance = None
+
+    @classmethod
+    def get_instance(self):
+        """
+        Get a shared instance of this EntityCache singleton
+
+        @return: Shared EntityCache instance
+        @rtype: EntityCache
+        """
+        if EntityCache.__instance == None:
+            EntityCache.__instance = EntityCache()
+
+        return EntityCache.__instance
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        """
+        Constructor for EntityCache
+
+        @note: This is a singleton and this should not be called externally
+        @keyword max_entries: The most encoded entities to keep between requests
+        @type max_entries: int
+        """
+        self.__max_entries = max_entries
+        self.__entries = collections.OrderedDict()
+        self.__generation = 0
+        self.__lock = threading.Lock()
+        self.__request = threading.local()
+        self.reset_stats()
+
+    def start_request(self):
+        """ Starts a new, empty identity map for the current request """
+        self.__request.instances = {}
+        self.__request.generation_checked = False
+
+    def end_request(self):
+        """ Drops the identity map of the current request """
+        self.__request.instances = None
+        self.__request.generation_checked = False
+
+    def needs_generation(self):
+        """
+        Determines if the shared generation should be read before using the LRU
+
+        @return: True if the generation has not been set during the current
+                 request (always True outside of a request)
+        @rtype: Boolean
+        """
+        return not getattr(self.__request, "generation_checked", False)
+
+    def set_generation(self, generation):
+        """
+        Moves to the generation shared by every instance, dropping all entries if it changed
+
+        @param generation: The shared generation, bumped whenever a cached entity is written
+        @type generation: int
+        """
+        with self.__lock:
+            if generation != self.__generation:
+                self.__generation = generation
+                self.__entries.clear()
+
+        if getattr(self.__request, "instances", None) != None:
+            self.__request.generation_checked = True
+
+    def get_request_instance(self, key):
+        """
+        Gets the instance already loaded for key during the current request
+
+        @param key: The key of the entity to look up
+        @type key: String
+        @return: The loaded instance or None if not loaded this request
+        @rtype: Model instance
+        """
+        instances = getattr(self.__request, "instances", None)
+        if instances == None or not key in instances:
+            return None
+
+        self.__identity_hits += 1
+        return instances[key]
+
+    def set_request_instance(self, key, instance):
+        """
+        Records the instance loaded for key during the current request
+
+        @note: Does nothing outside of a request
+        @param key: The key of the entity
+        @type key: String
+        @param instance: The loaded instance
+        @type instance: Model instance
+        """
+        instances = getattr(self.__request, "instances", None)
+        if instances != None:
+            instances[key] = instance
+
+    def get(self, key):
+        """
+        Gets the encoded entity for key if cached and not expired
+
+        @param key: The key of the entity to look up
+        @type key: String
+        @return: The encoded entity or None on a miss
+        @rtype: String
+        """
+        with self.__lock:
+            entry = self.__entries.get(key, None)
+
+            if entry == None:
+                self.__misses += 1
+                return None
+
+            generation, expires, encoded = entry
+            if generation != self.__generation or expires < time.time():
+                del self.__entries[key]
+                self.__misses += 1
+                return None
+
+            # Mark as most recently used
+            del self.__entries[key]
+            self.__entries[key] = entry
+            self.__hits += 1
+            return encoded
+
+    def set(self, key, encoded, ttl):
+        """
+        Caches the encoded entity for key, evicting the least recently used if full
+
+        @param key: The key of the entity
+        @type key: String
+        @param encoded: The encoded entity
+        @type encoded: String
+        @param ttl: Seconds the entity may be kept for, capped at MAX_LOCAL_TTL
+        @type ttl: int
+        """
+        expires = time.time() + min(ttl, EntityCache.MAX_LOCAL_TTL)
+
+        with self.__lock:
+            if key in self.__entries:
+                del self.__entries[key]
+
+            self.__entries[key] = (self.__generation, expires, encoded)
+
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+
+    def invalidate(self, keys):
+        """
+        Drops the given entities from the LRU and the current request's identity map
+
+        @param keys: The keys of the entities that changed
+        @type keys: List of Strings
+        """
+        instances = getattr(self.__request, "instances", None)
+
+        with self.__lock:
+            for key in keys:
+                self.__entries.pop(key, None)
+                if instances != None:
+                    instances.pop(key, None)
+
+    def invalidate_all(self):
+        """ Invalidates every cached entity by moving to a new local generation """
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+
+    def get_stats(self):
+        """
+        Gets counters describing how well the cache is performing
+
+        @return: Counts of LRU hits, misses and evictions, identity map hits,
+                 and the current number of entries
+        @rtype: Dictionary from String to int
+        """
+        return {
+            "hits" : self.__hits,
+            "misses" : self.__misses,
+            "evictions" : self.__evictions,
+            "identity_hits" : self.__identity_hits,
+            "entries" : len(self.__entries)
+        }
+
+    def reset_stats(self):
+        """ Sets all of the counters back to zero """
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__identity_hits = 0
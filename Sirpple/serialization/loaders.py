@@ -9,6 +9,7 @@ from backends import platform_manager
 from configparser import get_parser
 import model_spec
 import config_model
+import schema_snapshot
 
 class PropertyDefinitionLoader:
     """ Factory that creates PropertyDefinition """
@@ -157,6 +158,10 @@ class ClassDefinitionFactory:
         @rtype: ClassDefinition
         """
         
+        # Separate class options from fields
+        source = dict(source)
+        cache_ttl = source.pop(model_spec.ClassDefinition.CACHE_TTL_OPTION, None)
+
         # Construct fields
         field_factory = FieldDefinitionFactory.get_instance()
         fields = field_factory.get_fields(source)
@@ -176,7 +181,7 @@ class ClassDefinitionFactory:
         else:
             parent_field = fields[model_spec.ClassDefinition.DEFAULT_PARENT_FIELD]
 
-        return model_spec.ClassDefinition(name, fields, parent_class_name, parent_field)
+        return model_spec.ClassDefinition(name, fields, parent_class_name, parent_field, cache_ttl)
     
     def get_classes(self, sources):
         """
@@ -235,15 +240,97 @@ class ConfigModelFactoryMechanic:
         glob_path = os.path.normpath(os.path.join(directory,'*.' + extension))
         return glob(glob_path)
     
-    def load_factory_from_config(self, language, guiding_configuration):
+    def load_factory_from_config(self, language, guiding_configuration, use_snapshot=True):
         """
         Loads a single configuration to drive the creation of a ConfigModelFactory
 
         @param guiding_configuration: Encoded string with configuration containing other configuration files to use
         @type guiding_configuration: String
+        @keyword use_snapshot: If True, load definitions from the precompiled schema
+                               snapshot when it matches the configuration files. Defaults to True.
+        @type use_snapshot: Boolean
         @return: Modified shared instance of ConfigModelFactory
         @rtype: ConfigModelFactory
         """
+        overall_configuration, filenames = self.__find_config_files(language, guiding_configuration)
+
+        # Try the precompiled snapshot before parsing anything
+        if use_snapshot and "snapshot" in overall_configuration:
+            snapshot = schema_snapshot.SchemaSnapshot(overall_configuration["snapshot"])
+            source_hash = snapshot.compute_hash(language, filenames[0] + filenames[1])
+            definitions = snapshot.load(source_hash)
+
+            if definitions != None:
+                factory = config_model.ConfigModelFactory.get_instance()
+                factory.add_class_definitions(definitions[0])
+                factory.add_property_definitions(definitions[1])
+                return factory
+
+        # Load files
+        self.__load_config_files(language, filenames[0], filenames[1])
+
+        # Create factory
+        return config_model.ConfigModelFactory.get_instance()
+
+    def build_snapshot(self, language, guiding_configuration):
+        """
+        Parses the configuration files and writes the precompiled schema snapshot
+
+        @note: The deployed app can not write files so this must be run before deploying
+        @param language: The language the config files are written in
+        @type language: String
+        @param guiding_configuration: Encoded string with configuration containing other configuration files to use
+        @type guiding_configuration: String
+        @return: The location the snapshot was written to
+        @rtype: String
+        @raise ValueError: Raised if no snapshot location is configured
+        @raise IOError: Raised if the snapshot could not be written
+        """
+        overall_configuration, filenames = self.__find_config_files(language, guiding_configuration)
+
+        if not "snapshot" in overall_configuration:
+            raise ValueError("No snapshot location specified")
+
+        snapshot = schema_snapshot.SchemaSnapshot(overall_configuration["snapshot"])
+        source_hash = snapshot.compute_hash(language, filenames[0] + filenames[1])
+        class_definitions, property_definitions = self.__load_config_files(language, filenames[0], filenames[1])
+
+        if not snapshot.save(source_hash, class_definitions, property_definitions):
+            raise IOError("Could not write schema snapshot to " + overall_configuration["snapshot"])
+
+        return overall_configuration["snapshot"]
+
+    def has_current_snapshot(self, language, guiding_configuration):
+        """
+        Determines if the schema snapshot was built from the configuration files as they are now
+
+        @param language: The language the config files are written in
+        @type language: String
+        @param guiding_configuration: Encoded string with configuration containing other configuration files to use
+        @type guiding_configuration: String
+        @return: True if load_factory_from_config would load from the snapshot and False otherwise
+        @rtype: Boolean
+        """
+        overall_configuration, filenames = self.__find_config_files(language, guiding_configuration)
+
+        if not "snapshot" in overall_configuration:
+            return False
+
+        snapshot = schema_snapshot.SchemaSnapshot(overall_configuration["snapshot"])
+        source_hash = snapshot.compute_hash(language, filenames[0] + filenames[1])
+        return snapshot.load(source_hash) != None
+
+    def __find_config_files(self, language, guiding_configuration):
+        """
+        Finds the class and property configuration files named by the guiding configuration
+
+        @param language: The language the config files are written in
+        @type language: String
+        @param guiding_configuration: Encoded string with configuration containing other configuration files to use
+        @type guiding_configuration: String
+        @return: The decoded guiding configuration and the class and property file names
+        @rtype: Tuple of Dictionary and Tuple of two Lists of Strings
+        """
         parser = get_parser(language)
 
         overall_configuration = parser.loads(guiding_configuration)
@@ -258,22 +345,41 @@ class ConfigModelFactoryMechanic:
         class_definition_dir = overall_configuration["classes"]
         properties_definition_dir = overall_configuration["properties"]
 
-        # Load files
+        # Find files
         # WARNING: language name passed as file extension (yaml -> .yaml)
-        for filename in self.__get_files_from_dir(class_definition_dir, language):
+        class_filenames = self.__get_files_from_dir(class_definition_dir, language)
+        property_filenames = self.__get_files_from_dir(properties_definition_dir, language)
+
+        return (overall_configuration, (class_filenames, property_filenames))
+
+    def __load_config_files(self, language, class_filenames, property_filenames):
+        """
+        Parses the given configuration files into the shared ConfigModelFactory
+
+        @param language: The language the config files are written in
+        @type language: String
+        @param class_filenames: The files containing class definitions
+        @type class_filenames: List of Strings
+        @param property_filenames: The files containing property definitions
+        @type property_filenames: List of Strings
+        @return: The newly added class definitions and property definitions
+        @rtype: Tuple of dictionaries
+        """
+        class_definitions = {}
+        for filename in class_filenames:
 
             with open(filename) as f:
-                self.configure_factory_classes(language, f.read())
+                class_definitions.update(self.configure_factory_classes(language, f.read(), True))
         
-        for filename in self.__get_files_from_dir(properties_definition_dir, language):
+        property_definitions = {}
+        for filename in property_filenames:
 
             with open(filename) as f:
-                self.configure_factory_properties(language, f.read())
+                property_definitions.update(self.configure_factory_properties(language, f.read(), True))
 
-        # Create factory
-        return config_model.ConfigModelFactory.get_instance()
+        return (class_definitions, property_definitions)
     
-    def configure_factory_classes(self, language, class_definition_str):
+    def configure_factory_classes(self, language, class_definition_str, return_definitions=False):
         """
         Configures ConfigModelFactory models from the provided configuration formatted strings
 
@@ -281,8 +387,11 @@ class ConfigModelFactoryMechanic:
         @type language: String
         @param class_definition_str: The string containing information about class definitions
         @type class_definition_str: String
-        @return: Modified shared instance of ConfigModelFactory
-        @rtype: ConfigModelFactory
+        @keyword return_definitions: If True, return the newly added definitions
+                                     instead of the factory. Defaults to False.
+        @type return_definitions: Boolean
+        @return: Modified shared instance of ConfigModelFactory or the new definitions
+        @rtype: ConfigModelFactory or Dictionary from String to ClassDefinition
         """
 
         parser = get_parser(language)
@@ -296,16 +405,22 @@ class ConfigModelFactoryMechanic:
         factory = config_model.ConfigModelFactory.get_instance()
         factory.add_class_definitions(class_defintions)
 
+        if return_definitions:
+            return class_defintions
+
         return factory
     
-    def configure_factory_properties(self, language, property_definition_str):
+    def configure_factory_properties(self, language, property_definition_str, return_definitions=False):
         """
         Configures ConfigModelFactory type mapping from the provided configuration formatted strings
 
         @param property_definition_str: The string containing information about class definitions
         @type property_definition_str: String
-        @return: Modified shared instance of ConfigModelFactory
-        @rtype: ConfigModelFactory
+        @keyword return_definitions: If True, return the newly added definitions
+                                     instead of the factory. Defaults to False.
+        @type return_definitions: Boolean
+        @return: Modified shared instance of ConfigModelFactory or the new definitions
+        @rtype: ConfigModelFactory or Dictionary from String to PropertyDefinition
         """
 
         parser = get_parser(language)
@@ -319,4 +434,7 @@ class ConfigModelFactoryMechanic:
         factory = config_model.ConfigModelFactory.get_instance()
         factory.add_property_definitions(property_definitions)
 
+        if return_definitions:
+            return property_definitions
+
         return factory
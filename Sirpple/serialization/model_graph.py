@@ -7,19 +7,31 @@ class ModelGraph:
     """ 
     Graph of model schema structure as loaded from configuration files
 
-    Lazily loaded graph container that maintains dependencies between model
+    Shared graph container that maintains dependencies between model
      classes and other structural elements of the database / model schema
     """
 
+    NO_CHILDREN_CLASSES = frozenset()
+
+    __current_graph = None
+
     @classmethod
     def get_current_graph(self):
         """ 
-        Creates a new ModelGraph out of the current model factory state
+        Gets the shared ModelGraph for the current model factory state
 
+        @note: A new graph is built and swapped in when the factory's schema changes
         @return: Graph of current state of classes loaded from configuration
         @rtype: ModelGraph
         """
-        return ModelGraph(config_model.ConfigModelFactory.get_instance())
+        factory = config_model.ConfigModelFactory.get_instance()
+        graph = ModelGraph.__current_graph
+
+        if graph == None or graph.get_schema_version() != factory.get_schema_version():
+            graph = ModelGraph(factory)
+            ModelGraph.__current_graph = graph
+
+        return graph
 
     def __init__(self, factory):
         """
@@ -29,7 +41,22 @@ class ModelGraph:
         @type factory: ConfigModelFactory
         """
         self.__factory = factory
+        self.__schema_version = factory.get_schema_version()
         self.__field_relationship_cache = {}
+        self.__descendant_classes_cache = {}
+
+        # Build the parent to children index up front so lookups never scan
+        pm = backends.platform_manager.PlatformManager.get_instance()
+        self.__load_field_relationships(pm.get_parent_field_name())
+    
+    def get_schema_version(self):
+        """
+        Gets the version of the factory schema this graph was built from
+
+        @return: Schema version as reported by ConfigModelFactory
+        @rtype: int
+        """
+        return self.__schema_version
     
     def get_class_definition(self, class_name):
         """
@@ -51,8 +78,8 @@ class ModelGraph:
 
         @param model_class: The class to find children for
         @type model_class: Any registered (in config file) model class object
-        @return: List of parent classes
-        @rtype: List of ClassDefinitions
+        @return: Children classes
+        @rtype: frozenset of ClassDefinitions
         """
         model_class_name = model_class.__name__
         
@@ -70,7 +97,7 @@ class ModelGraph:
 
         # Return children
         if not model_class_name in relationships:
-            return []
+            return ModelGraph.NO_CHILDREN_CLASSES
         else:
             return relationships[model_class_name]
     
@@ -83,14 +110,105 @@ class ModelGraph:
         @return: Dictionary of immediate children of target_model by type
         @rtype: Dictionary of ClassDefinitions to Model instances
         """
-        
+        return self.get_children_many([target_model])[target_model]
+
+    def get_children_many(self, target_models, children_classes=None):
+        """
+        Get all of the immediate children of many models at once
+
+        Starts every children query before reading any results so the datastore
+        round trips overlap instead of running one after another
+
+        @param target_models: The model instances to get the children for
+        @type target_models: List of Model instances
+        @keyword children_classes: Only fetch children of these classes. If None,
+                                   fetch all children classes. Defaults to None.
+        @type children_classes: List of ClassDefinitions
+        @return: Dictionary of immediate children by parent and then by type
+        @rtype: Dictionary of Model instances to Dictionary of ClassDefinitions to Model instances
+        """
         children = {}
-        for class_defn in self.get_children_classes(target_model.__class__):
-            new_children = list(target_model.get_children(class_defn.get_class()))
-            children[class_defn] = new_children
+        pending = []
+
+        # Start all of the queries
+        for target_model in target_models:
+            children[target_model] = {}
+
+            for class_defn in self.get_children_classes(target_model.__class__):
+
+                if children_classes != None and not class_defn in children_classes:
+                    continue
+
+                results = target_model.get_children_async(class_defn.get_class())
+                pending.append((target_model, class_defn, results))
+
+        # Collect results
+        for target_model, class_defn, results in pending:
+            children[target_model][class_defn] = list(results)
 
         return children
     
+    def get_descendant_classes(self, model_class):
+        """
+        Determines every class that can appear below the given model class
+
+        Walks the children classes breadth first, returning each class once
+
+        @param model_class: The class to find descendants for
+        @type model_class: Any registered (in config file) model class object
+        @return: Descendant classes in breadth first order
+        @rtype: List of ClassDefinitions
+        """
+        model_class_name = model_class.__name__
+
+        if model_class_name in self.__descendant_classes_cache:
+            return self.__descendant_classes_cache[model_class_name]
+
+        descendants = []
+        level = list(self.get_children_classes(model_class))
+        while level:
+            next_level = []
+
+            for class_defn in level:
+                if class_defn in descendants:
+                    continue
+                descendants.append(class_defn)
+                next_level.extend(self.get_children_classes(class_defn.get_class()))
+
+            level = next_level
+
+        self.__descendant_classes_cache[model_class_name] = descendants
+        return descendants
+
+    def get_subtree(self, root_model):
+        """
+        Get every descendant of root_model grouped by parent
+
+        Runs one ancestor query per descendant class, all started before any
+        results are read, so a whole project loads in a single round of queries
+
+        @param root_model: The model instance to load the hierarchy under
+        @type root_model: Any Model instance
+        @return: Dictionary of immediate children by parent key and then by type.
+                 Models without children do not have an entry.
+        @rtype: Dictionary of Keys to Dictionary of ClassDefinitions to Model instances
+        """
+        subtree = {}
+        pending = []
+
+        # Start all of the queries
+        for class_defn in self.get_descendant_classes(root_model.__class__):
+            results = root_model.get_children_async(class_defn.get_class())
+            pending.append((class_defn, results))
+
+        # Group results under their parents
+        for class_defn, results in pending:
+            for instance in results:
+                siblings = subtree.setdefault(instance.get_parent_key(), {})
+                siblings.setdefault(class_defn, []).append(instance)
+
+        return subtree
+    
     def __load_field_relationships(self, field_name):
         """ 
         Determine all of the relationships for the field of the given name
@@ -120,5 +238,9 @@ class ModelGraph:
                 
                 # Add ourselves
                 relationships[type_name].add(class_def)
+
+        # Freeze so the shared graph can not be altered by callers
+        for type_name in relationships:
+            relationships[type_name] = frozenset(relationships[type_name])
             
         self.__field_relationship_cache[field_name] = relationships
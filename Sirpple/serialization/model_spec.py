@@ -6,6 +6,24 @@ from backends import platform_manager
 import config_model
 import model_graph
 
+class FrozenFieldTable(dict):
+    """
+    Read only dictionary of field names to field definitions shared between callers
+
+    @note: Returned by ClassDefinition.get_fields so cached tables can not be altered
+    """
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("Field tables are read only, copy with dict() before modifying")
+
+    __setitem__ = __readonly
+    __delitem__ = __readonly
+    clear = __readonly
+    pop = __readonly
+    popitem = __readonly
+    setdefault = __readonly
+    update = __readonly
+
 class FieldDefinition:
     """
     Definition of a field as part of a database model
@@ -93,8 +111,9 @@ class ClassDefinition:
     """ Definition of a model loaded through a configuration secification """
 
     DEFAULT_PARENT_FIELD = "parent" # This is db independent
+    CACHE_TTL_OPTION = "__cache_ttl__"
 
-    def __init__(self, name, fields, parent_class, parent_field):
+    def __init__(self, name, fields, parent_class, parent_field, cache_ttl=None):
         """
         Constructor for ClassDefintion
 
@@ -106,12 +125,42 @@ class ClassDefinition:
         @type parent_class: String
         @param parent_field: The definition of the field that contains parent information
         @type pareent_field: FieldDefinition
+        @keyword cache_ttl: Seconds to cache instances of this class for or None
+                            to use the parent class' setting. Defaults to None.
+        @type cache_ttl: int
         """
         self.__fields = fields
         self.__name = name
         self.__parent_class_name = parent_class
         self.__class = None
         self.__parent_field = parent_field
+        self.__cache_ttl = cache_ttl
+        self.__field_tables = {}
+        self.__field_tables_version = None
+
+    def __getstate__(self):
+        """
+        Get the picklable state of this definition, leaving out lazily built caches
+
+        @return: Instance dictionary without the generated class or field tables
+        @rtype: Dictionary
+        """
+        state = self.__dict__.copy()
+        state["_ClassDefinition__class"] = None
+        state["_ClassDefinition__field_tables"] = {}
+        state["_ClassDefinition__field_tables_version"] = None
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restore this definition from a pickled state
+
+        @param state: Instance dictionary as produced by __getstate__
+        @type state: Dictionary
+        """
+        self.__dict__.update(state)
+        self.__field_tables = {}
+        self.__field_tables_version = None
     
     def get_name(self):
         """
@@ -134,28 +183,56 @@ class ClassDefinition:
         @type include_inherited: True
         @return: Dicationary of fields
         @rtype: Dictionary from String to FieldDefition
+        @note: Tables are built once per schema version and shared, do not modify them
+        """
+        factory = config_model.ConfigModelFactory.get_instance()
+        version = factory.get_schema_version()
+
+        # Drop tables built against an older schema
+        if self.__field_tables_version != version:
+            self.__field_tables = {}
+            self.__field_tables_version = version
+
+        table_key = (include_built_in, include_inherited)
+        if not table_key in self.__field_tables:
+            self.__field_tables[table_key] = self.__build_field_table(include_built_in, include_inherited)
+
+        return self.__field_tables[table_key]
+
+    def __build_field_table(self, include_built_in, include_inherited):
+        """
+        Resolves the fields this class definition has for the given options
+
+        @param include_built_in: If true, include built in properties
+        @type include_built_in: Boolean
+        @param include_inherited: Put inherited fields in the resulting dictionary
+        @type include_inherited: Boolean
+        @return: Dictionary of fields
+        @rtype: FrozenFieldTable
         """
-        top_superclass = config_model.ConfigModelFactory.get_instance().DEFAULT_PARENT_CLASS_DESCRIPTOR;
+        top_superclass = config_model.ConfigModelFactory.get_instance().DEFAULT_PARENT_CLASS_DESCRIPTOR
 
         if include_built_in:
-            fields = self.__fields
+            fields = dict(self.__fields)
         else:
-            def builtin_filter(item):
-                return not item[1].is_built_in()
-            
-            fields = filter(builtin_filter, self.__fields.items())
-            fields = dict(fields)
+            built_in_names = platform_manager.PlatformManager.get_instance().get_built_in_field_names()
+
+            fields = {}
+            for field_name, field in self.__fields.items():
+                if not field.get_name() in built_in_names:
+                    fields[field_name] = field
         
         if include_inherited and self.__parent_class_name != top_superclass:
 
-            graph = model_graph.ModelGraph.get_current_graph()
-            parent_defn = graph.get_class_definition(self.__parent_class_name)
+            # Go to the factory directly as the shared graph builds its index from these tables
+            factory = config_model.ConfigModelFactory.get_instance()
+            parent_defn = factory.get_class_definition(self.__parent_class_name)
 
             new_fields = parent_defn.get_fields(include_built_in, include_inherited)
 
             fields.update(new_fields)
         
-        return fields
+        return FrozenFieldTable(fields)
     
     def get_class(self):
         """
@@ -174,6 +251,9 @@ class ClassDefinition:
             for field_name in self.get_fields(include_inherited=False, include_built_in=False):
                 python_fields[field_name] = self.__fields[field_name].get_field()
             
+            if self.__cache_ttl != None:
+                python_fields["CACHE_TTL"] = self.__cache_ttl
+
             class_factory = config_model.ConfigModelFactory.get_instance()
 
             parent_class = class_factory.get_model(self.__parent_class_name)
@@ -182,6 +262,15 @@ class ClassDefinition:
         
         return self.__class
     
+    def get_cache_ttl(self):
+        """
+        Gets how long instances of this class should be cached for
+
+        @return: Seconds to cache instances for or None if not set by this class
+        @rtype: int
+        """
+        return self.__cache_ttl
+
     def get_parent_field(self):
         """
         Gets the name of the field that contains a reference to this instance's parent
@@ -256,6 +345,16 @@ class PropertyDefinition:
         @rtype: Boolean
         """
         return False
+
+    def is_projectable(self):
+        """
+        Determines if fields of this type can be read through a projection query
+
+        @return: True if the backend can return this property without loading the
+                 whole entity and False otherwise
+        @rtype: Boolean
+        """
+        return False
     
     def get_property(self, field_name):
         """
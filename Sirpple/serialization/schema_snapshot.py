@@ -0,0 +1,98 @@
+"""
+Precompiled snapshots of the model schema loaded from configuration files
+"""
+
+import hashlib
+import logging
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+class SchemaSnapshot:
+    """
+    Binary snapshot of class and property definitions keyed by a hash of their sources
+
+    Lets cold instances skip parsing the configuration files when the snapshot
+    on disk was compiled from exactly the same sources
+    """
+
+    # Bump when the layout of the definitions changes so old snapshots are ignored
+    FORMAT_VERSION = "2"
+
+    def __init__(self, location):
+        """
+        Create a new snapshot stored at the given location
+
+        @param location: The path to the snapshot file
+        @type location: String
+        """
+        self.__location = location
+
+    def compute_hash(self, language, filenames):
+        """
+        Computes the content hash of the given configuration files
+
+        @param language: The language the config files are written in
+        @type language: String
+        @param filenames: The configuration files the schema is loaded from
+        @type filenames: List of Strings
+        @return: Hex digest identifying the contents of the given files
+        @rtype: String
+        """
+        digest = hashlib.sha1(SchemaSnapshot.FORMAT_VERSION + language)
+
+        for filename in sorted(filenames):
+            with open(filename, "rb") as f:
+                contents = f.read()
+            digest.update("%s\0%d\0" % (filename, len(contents)))
+            digest.update(contents)
+
+        return digest.hexdigest()
+
+    def load(self, source_hash):
+        """
+        Loads the definitions saved in this snapshot if it matches the given hash
+
+        @param source_hash: The hash of the configuration files currently in use
+        @type source_hash: String
+        @return: Class definitions and property definitions or None if the
+                 snapshot is missing or stale
+        @rtype: Tuple of dictionaries or None
+        """
+        try:
+            with open(self.__location, "rb") as f:
+                if f.readline().rstrip("\n") != source_hash:
+                    return None
+                contents = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError), e:
+            logging.debug("Schema snapshot unavailable: " + str(e))
+            return None
+
+        return (contents["classes"], contents["properties"])
+
+    def save(self, source_hash, class_definitions, property_definitions):
+        """
+        Writes the given definitions out to this snapshot
+
+        @param source_hash: The hash of the configuration files the definitions came from
+        @type source_hash: String
+        @param class_definitions: Class names mapped to their definitions
+        @type class_definitions: Dictionary from String to ClassDefinition
+        @param property_definitions: Property names mapped to their definitions
+        @type property_definitions: Dictionary from String to PropertyDefinition
+        @return: True if the snapshot was written and False otherwise (read only filesystem)
+        @rtype: Boolean
+        """
+        contents = {"classes": class_definitions, "properties": property_definitions}
+
+        try:
+            with open(self.__location, "wb") as f:
+                f.write(source_hash + "\n")
+                pickle.dump(contents, f, pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError), e:
+            logging.info("Could not write schema snapshot: " + str(e))
+            return False
+
+        return True
@@ -0,0 +1,128 @@
+"""
+Serializers that write data transfer objects out in the formats offered by the REST API
+"""
+
+import json
+
+class SerializerFactory:
+    """ Factory that chooses the serializer for the requested format """
+
+    __serializers = None
+
+    @classmethod
+    def get_serializer(self, format_name):
+        """
+        Get the shared serializer for the given format
+
+        @param format_name: The name of the format to serialize to (ie complex-JSON)
+        @type format_name: String
+        @return: Serializer for the given format
+        @rtype: Serializer implementor
+        """
+        if SerializerFactory.__serializers == None:
+            SerializerFactory.__serializers = {"complex-JSON" : ComplexJSONSerializer()}
+
+        if not format_name in SerializerFactory.__serializers:
+            raise KeyError("Serializer not available for " + format_name)
+
+        return SerializerFactory.__serializers[format_name]
+
+class Serializer:
+    """ Interface for writing data transfer objects out in a specific format """
+
+    def __init__(self):
+        pass
+
+    def get_content_type(self):
+        """
+        Get the MIME type of the serialized output
+
+        @return: Content type to report in responses
+        @rtype: String
+        """
+        raise NotImplementedError("Must use implementor of this abstract class")
+
+    def dump(self, target, out):
+        """
+        Writes target to the given stream
+
+        @param target: The data transfer object to write
+        @type target: Dictionary
+        @param out: The stream to write to
+        @type out: File-like object
+        """
+        raise NotImplementedError("Must use implementor of this abstract class")
+
+    def dump_all(self, targets, out):
+        """
+        Writes a list of data transfer objects to the given stream one at a time
+
+        @param targets: The data transfer objects to write. Only iterated once
+                        so generators are written without being held in memory.
+        @type targets: Iterable of Dictionaries
+        @param out: The stream to write to
+        @type out: File-like object
+        """
+        raise NotImplementedError("Must use implementor of this abstract class")
+
+    def dumps(self, target):
+        """
+        Serializes target to a string
+
+        @param target: The data transfer object to write
+        @type target: Dictionary
+        @return: Serialized target
+        @rtype: String
+        """
+        raise NotImplementedError("Must use implementor of this abstract class")
+
+class ComplexJSONSerializer(Serializer):
+    """ Serializer that writes JSON, converting model values the json module does not know """
+
+    def __init__(self):
+        Serializer.__init__(self)
+        self.__encoder = json.JSONEncoder(default=self.__convert, separators=(",", ":"))
+
+    def get_content_type(self):
+        return "application/json"
+
+    def dump(self, target, out):
+        out.write(self.__encoder.encode(target))
+
+    def dump_all(self, targets, out):
+        out.write("[")
+
+        first = True
+        for target in targets:
+            if not first:
+                out.write(",")
+            first = False
+            self.dump(target, out)
+
+        out.write("]")
+
+    def dumps(self, target):
+        return self.__encoder.encode(target)
+
+    def __convert(self, value):
+        """
+        Converts values the json module can not encode
+
+        @param value: The value to convert (model instance, key, date, user, etc.)
+        @type value: Any
+        @return: JSON compatible version of value
+        @rtype: int, String, or list
+        """
+        # Referenced models are written as their ids
+        if hasattr(value, "get_id"):
+            return value.get_id()
+
+        # Dates and times
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+
+        # Sets and other collections
+        if hasattr(value, "__iter__"):
+            return list(value)
+
+        return unicode(value)
@@ -0,0 +1,52 @@
+""" Benchmarks comparing single entity REST saves against the batch processor """
+
+from google.appengine.ext import db
+from rest import batch
+from test.rpc_counter import counter
+from uac import uac_checker
+
+import yamlmodels
+
+globals().update(yamlmodels.load())
+
+def compare_batch_save(entities="100"):
+    entities = int(entities)
+    checker = uac_checker.GAEUACChecker.get_instance()
+
+    proj = Project(name="Batch Benchmark Project")
+    proj.put()
+
+    objects = []
+    for i in range(0, entities):
+        objects.append(GameObject(parent=proj, name="Object %d" % i, type=i))
+    db.put(objects)
+
+    # One request per entity: read it, authorize it, write it back
+    def single():
+        for game_object in objects:
+            instance = GameObject.get_by_id(game_object.get_id(), parent=proj)
+            checker.is_authorized(instance, None)
+            instance.name = instance.name + "!"
+            instance.put()
+
+    # One request for all of the entities, written back as is since the
+    # model config does not expose name through the REST API
+    def batched():
+        processor = batch.GAEBatchProcessor(checker)
+        operations = processor.parse(map(lambda x: {
+            "action" : batch.BatchOperation.UPDATE,
+            "__class__" : "GameObject",
+            "__key__" : x.get_key_string(),
+            "fields" : {}
+        }, objects))
+        processor.load(operations)
+        processor.is_authorized(operations, None)
+        processor.commit(operations)
+
+    single_rpcs, single_time = counter.measure(single)
+    batched_rpcs, batched_time = counter.measure(batched)
+
+    print "Single: %d requests, %d datastore RPCs in %.1f ms" % (entities, single_rpcs, single_time * 1000)
+    print "Batch:  1 request, %d datastore RPCs in %.1f ms" % (batched_rpcs, batched_time * 1000)
+
+    db.delete(objects + [proj])
@@ -0,0 +1,39 @@
+""" Tests checking that the memcache backed caches do not hand out outdated results """
+
+from google.appengine.ext import db
+from serialization import adapted_models
+from test.rpc_counter import counter
+
+class CacheTestParent(adapted_models.GAEAdaptedModel):
+    """ Parent of the children lists being cached """
+
+class CacheTestChild(adapted_models.GAEAdaptedModel):
+    """ Child class whose lists are kept in memcache """
+
+    CACHE_TTL = 60
+    name = db.StringProperty()
+
+def __read_names(parent):
+    return sorted(map(lambda x: x.name, parent.get_children_async(CacheTestChild)))
+
+def check_children_cache():
+    parent = CacheTestParent()
+    parent.put()
+    CacheTestChild(parent=parent, name="first").put()
+
+    try:
+        # A write landing while a list is still being read must not be hidden by it
+        results = parent.get_children_async(CacheTestChild)
+        first = next(results)
+        CacheTestChild(parent=parent, name="second").put()
+        list(results)
+        assert __read_names(parent) == ["first", "second"], "children written during a read are listed"
+
+        rpcs, seconds = counter.measure(lambda: __read_names(parent))
+        assert rpcs == 0, "unchanged children are read from memcache"
+
+        # Deleting goes through the same generation
+        CacheTestChild.all().ancestor(parent).filter("name =", "first").get().delete()
+        assert __read_names(parent) == ["second"], "deleted children are not listed"
+    finally:
+        db.delete(CacheTestChild.all(keys_only=True).ancestor(parent).fetch(None) + [parent.key()])
@@ -0,0 +1,46 @@
+""" Benchmarks for fetching children through the ModelGraph against the datastore stub """
+
+from google.appengine.ext import db
+from serialization import model_graph
+from test.rpc_counter import counter
+
+import yamlmodels
+
+globals().update(yamlmodels.load())
+
+def __populate(num_projects, num_children):
+    projects = []
+    created = []
+    for i in range(0, num_projects):
+        proj = Project(name="Benchmark Project %d" % i)
+        proj.put()
+
+        for j in range(0, num_children):
+            created.append(World(parent=proj, name="World %d" % j))
+            created.append(GameObject(parent=proj, name="Object %d" % j, type=j))
+            created.append(Event(parent=proj, name="Event %d" % j))
+
+        projects.append(proj)
+
+    db.put(created)
+    return projects, created
+
+def compare_children_fetch(projects="5", children="10"):
+    graph = model_graph.ModelGraph.get_current_graph()
+    targets, created = __populate(int(projects), int(children))
+
+    def sequential():
+        for target in targets:
+            for class_defn in graph.get_children_classes(target.__class__):
+                list(target.get_children(class_defn.get_class()))
+
+    def batched():
+        graph.get_children_many(targets)
+
+    sequential_rpcs, sequential_time = counter.measure(sequential)
+    batched_rpcs, batched_time = counter.measure(batched)
+
+    print "Sequential: %d datastore RPCs in %.1f ms" % (sequential_rpcs, sequential_time * 1000)
+    print "Batched:    %d datastore RPCs in %.1f ms" % (batched_rpcs, batched_time * 1000)
+
+    db.delete(created + targets)
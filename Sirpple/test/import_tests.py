@@ -0,0 +1,28 @@
+""" Tests checking that the modules the application is assembled from can be imported """
+
+import importlib
+import webapp2
+
+from serialization import config_model
+
+# Modules imported when main.py builds the application and the handlers it routes to
+APP_MODULES = ["main", "yamlmodels", "configparser", "testcontrollers", "page_builder.managers",
+    "serialization.loaders", "serialization.model_graph", "serialization.adapted_models",
+    "serialization.serializers", "serialization.dto", "rest.gae_controllers", "rest.batch", "uac.uac_checker"]
+
+def check_app_imports():
+    for module_name in APP_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError, e:
+            assert False, "%s imports (%s)" % (module_name, e)
+
+def check_controllers_construct():
+    from rest import gae_controllers
+
+    factory = config_model.ConfigModelFactory.get_instance()
+    for class_definition in factory.get_class_definitions().values():
+        request = webapp2.Request.blank("/")
+        gae_controllers.GAEController(class_definition.get_class(), request, webapp2.Response())
+
+    gae_controllers.GAEBatchController(webapp2.Request.blank("/"), webapp2.Response())
@@ -0,0 +1,42 @@
+""" Helpers for counting datastore round trips made by benchmarks """
+
+import time
+
+from google.appengine.api import apiproxy_stub_map
+
+HOOK_NAME = "benchmark_rpc_counter"
+
+class RoundTripCounter:
+    """ Counts the datastore RPCs made while enabled """
+
+    def __init__(self):
+        self.enabled = False
+        self.count = 0
+
+    def record(self, service, call, request, response):
+        """ Hook called by the API proxy before each datastore RPC """
+        if self.enabled:
+            self.count += 1
+
+    def measure(self, operation):
+        """
+        Runs operation while counting
+
+        @param operation: The function to run
+        @type operation: Callable with no arguments
+        @return: Number of datastore RPCs made and seconds taken
+        @rtype: Tuple of int and float
+        """
+        self.count = 0
+        self.enabled = True
+
+        start = time.time()
+        try:
+            operation()
+        finally:
+            self.enabled = False
+
+        return self.count, time.time() - start
+
+counter = RoundTripCounter()
+apiproxy_stub_map.apiproxy.GetPreCallHooks().Append(HOOK_NAME, counter.record, "datastore_v3")
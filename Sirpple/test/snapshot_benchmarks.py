@@ -0,0 +1,38 @@
+""" Benchmarks comparing cold schema loads from YAML against the precompiled snapshot """
+
+import time
+
+from serialization import config_model
+from serialization import loaders
+
+CONFIG_LOCATION = "app_config.yaml"
+
+def __time_loads(runs, use_snapshot):
+    factory = config_model.ConfigModelFactory.get_instance()
+    mechanic = loaders.ConfigModelFactoryMechanic.get_instance()
+
+    with open(CONFIG_LOCATION) as f:
+        configuration = f.read()
+
+    start = time.time()
+    for i in range(0, runs):
+        factory.reset()
+        mechanic.load_factory_from_config("yaml", configuration, use_snapshot=use_snapshot)
+    return (time.time() - start) / runs
+
+def compare_schema_load(runs="20"):
+    runs = int(runs)
+
+    # The snapshot is built before deploying, the app can not write it
+    with open(CONFIG_LOCATION) as f:
+        configuration = f.read()
+    if not loaders.ConfigModelFactoryMechanic.get_instance().has_current_snapshot("yaml", configuration):
+        print "Schema snapshot missing or stale, run python yamlmodels.py first"
+        return
+
+    yaml_time = __time_loads(runs, False)
+    snapshot_time = __time_loads(runs, True)
+
+    print "YAML load:     %.3f ms" % (yaml_time * 1000)
+    print "Snapshot load: %.3f ms" % (snapshot_time * 1000)
+    print "Speedup:       %.1fx" % (yaml_time / snapshot_time)
@@ -0,0 +1,130 @@
+""" Tests checking project membership rules of the UAC checker """
+
+from google.appengine.api import memcache
+from google.appengine.api import users
+from google.appengine.ext import db
+from test.rpc_counter import counter
+from uac import uac_checker
+
+import yamlmodels
+
+globals().update(yamlmodels.load())
+
+def __create_project(name):
+    project = Project(name=name)
+    project.put()
+    return project
+
+def __delete_project(project):
+    db.delete(db.Query(keys_only=True).ancestor(project).fetch(None))
+
+def check_membership_enforced():
+    checker = uac_checker.GAEUACChecker.get_instance()
+    member = users.User("member@example.com", _user_id="uac-member")
+    stranger = users.User("stranger@example.com", _user_id="uac-stranger")
+
+    project = __create_project("UAC Member Project")
+    Membership(parent=project, user=member).put()
+    game_object = GameObject(parent=project, name="Object")
+    game_object.put()
+    unsaved = GameObject(parent=project, name="Unsaved")
+
+    try:
+        targets = [project, game_object, unsaved]
+        assert checker.is_authorized_many(targets, member) == [True, True, True], "members may access their project"
+        assert checker.is_authorized_many(targets, stranger) == [False, False, False], "others may not"
+        assert checker.is_authorized_many(targets, None) == [False, False, False], "signed out users may not"
+        assert checker.is_authorized(Project(name="New"), stranger), "anyone signed in may create a project"
+        assert not checker.is_authorized(Project(name="New"), None), "signed out users may not create a project"
+    finally:
+        __delete_project(project)
+
+def check_unclaimed_project():
+    checker = uac_checker.GAEUACChecker.get_instance()
+    first = users.User("first@example.com", _user_id="uac-first")
+    second = users.User("second@example.com", _user_id="uac-second")
+
+    # Projects created before memberships existed have no Membership at all
+    project = __create_project("UAC Unclaimed Project")
+
+    try:
+        assert checker.is_authorized(project, first), "the first user claims a project without members"
+        assert not checker.is_authorized(project, second), "later users are not members"
+        assert checker.is_authorized(project, first), "the claim is kept"
+
+        memberships = Membership.all().ancestor(project).fetch(None)
+        assert len(memberships) == 1 and memberships[0].user == first, "one Membership is written for the claim"
+    finally:
+        __delete_project(project)
+
+def check_membership_cache():
+    checker = uac_checker.GAEUACChecker.get_instance()
+    user = users.User("cached@example.com", _user_id="uac-cached")
+    project = __create_project("UAC Cached Project")
+    Membership(parent=project, user=user).put()
+
+    checker.start_request()
+    try:
+        checker.reset_membership_stats()
+        assert str(project.key()) in checker.get_authorized_project_keys(user), "memberships are looked up"
+
+        rpcs, seconds = counter.measure(lambda: checker.get_authorized_project_keys(user))
+        assert rpcs == 0, "a second lookup in the request does not touch the datastore"
+        assert checker.get_membership_stats() == {"local_hits" : 1, "memcache_hits" : 0, "misses" : 1}, \
+            "the second lookup is a local hit"
+    finally:
+        checker.end_request()
+        __delete_project(project)
+
+def check_membership_invalidation():
+    checker = uac_checker.GAEUACChecker.get_instance()
+    user = users.User("invalidated@example.com", _user_id="uac-invalidated")
+    first = __create_project("UAC First Project")
+    second = __create_project("UAC Second Project")
+    third = __create_project("UAC Third Project")
+    Membership(parent=first, user=user).put()
+
+    try:
+        checker.start_request()
+        assert checker.get_authorized_project_keys(user) == frozenset([str(first.key())]), "memberships are looked up"
+
+        # Written on this instance, the write listener drops the cached index
+        Membership(parent=second, user=user).put()
+        assert str(second.key()) in checker.get_authorized_project_keys(user), "local writes are seen right away"
+        checker.end_request()
+
+        # Written on another instance, only the generation in memcache moves on
+        db.put(Membership(parent=third, user=user))
+        memcache.incr(uac_checker.GAEUACChecker.MEMBERSHIP_GENERATION_KEY)
+
+        checker.start_request()
+        assert str(third.key()) in checker.get_authorized_project_keys(user), "writes on other instances are seen next request"
+        checker.end_request()
+    finally:
+        checker.end_request()
+        for project in (first, second, third):
+            __delete_project(project)
+
+def check_key_path_resolution():
+    checker = uac_checker.GAEUACChecker.get_instance()
+    project = __create_project("UAC Key Path Project")
+    game_object = GameObject(parent=project, name="Object")
+    game_object.put()
+    method = GameObjectMethod(parent=game_object, name="method")
+    method.put()
+
+    # Not yet saved instances still know the project they will be saved under
+    unsaved = GameObjectMethod(parent=game_object, name="unsaved")
+    unsaved_under_key = GameObjectMethod(parent=game_object.key(), name="unsaved")
+
+    try:
+        targets = [project, game_object, method, unsaved, unsaved_under_key]
+        rpcs, seconds = counter.measure(lambda: checker.get_project_keys(targets))
+        assert rpcs == 0, "key paths are resolved without the datastore"
+        assert checker.get_project_keys(targets) == [project.key()] * len(targets), "targets resolve to their project"
+
+        # Nothing outside of a project's entity group is owned by it
+        outside = [None, Project(name="Unsaved"), GameObject(name="Root"), Membership()]
+        assert checker.get_project_keys(outside) == [None] * len(outside), "targets outside projects have none"
+    finally:
+        __delete_project(project)
@@ -0,0 +1,49 @@
+""" Benchmarks for prerendering the EJS view fragments embedded in app.html """
+
+import os
+import time
+
+from page_builder import builders
+from page_builder import prerenderers
+
+VIEWS_DIR = "./views"
+APP_TEMPLATE = "app.html"
+
+def __time_renders(runs, prerenderer):
+    start = time.time()
+    for i in range(0, runs):
+        builders.PageBuilder(APP_TEMPLATE, VIEWS_DIR, "{* %s *}", prerenderer=prerenderer).render()
+    return (time.time() - start) / runs
+
+def compare_view_prerender(runs="20"):
+    runs = int(runs)
+
+    fragments = filter(lambda x: x.endswith(".html") and x != APP_TEMPLATE, os.listdir(VIEWS_DIR))
+    dynamic = 0
+    for fragment in fragments:
+        with open(os.path.join(VIEWS_DIR, fragment)) as f:
+            if f.read().find(prerenderers.EJSPrerenderer.LEFT_DELIMITER) != -1:
+                dynamic += 1
+
+    # A new prerenderer per run compiles every fragment, a shared one compiles each once
+    plain_time = __time_renders(runs, None)
+    cold_time = 0.0
+    for i in range(0, runs):
+        cold_time += __time_renders(1, prerenderers.EJSPrerenderer())
+    cold_time /= runs
+    shared = prerenderers.EJSPrerenderer()
+    warm_time = __time_renders(runs, shared)
+
+    print "%d fragments, %d with EJS tags" % (len(fragments), dynamic)
+    print "Assembly without prerendering: %.3f ms" % (plain_time * 1000)
+    print "Assembly compiling fragments:  %.3f ms" % (cold_time * 1000)
+    print "Assembly with cached fragments: %.3f ms" % (warm_time * 1000)
+    print "Cache stats: %s" % shared.get_stats()
+
+    # Time-to-interactive can only be measured by a browser loading both pages
+    plain_page = builders.PageBuilder(APP_TEMPLATE, VIEWS_DIR, "{* %s *}").render()
+    prerendered_page = builders.PageBuilder(APP_TEMPLATE, VIEWS_DIR, "{* %s *}", prerenderer=shared).render()
+    print "Page without prerendering: %d bytes, %d templates compiled by the client" % (len(plain_page), dynamic)
+    print "Page with prerendering:    %d bytes, 0 templates compiled by the client" % len(prerendered_page)
+    print "Time-to-interactive before: load /app?prerender=0 and read pageTiming.interactive"
+    print "Time-to-interactive after:  load /app and read pageTiming.interactive"
@@ -0,0 +1,19 @@
+""" Tests for the prerendering of EJS view fragments """
+
+from page_builder import prerenderers
+
+STATIC = "<div class=\"pane\">Static</div>\n"
+DYNAMIC = "<ul>\n<% for (var i = 0; i < items.length; i++) { %>\n\t<li><%= items[i] %></li>\n<% } %>\n</ul>\n"
+
+def check_static_fragment():
+    prerenderer = prerenderers.EJSPrerenderer()
+    assert prerenderer.prerender("static.html", STATIC) == STATIC, "static fragments are left as markup"
+
+def check_dynamic_fragment():
+    prerenderer = prerenderers.EJSPrerenderer()
+    output = prerenderer.prerender("dynamic.html", DYNAMIC)
+
+    assert output.startswith(DYNAMIC), "the markup of dynamic fragments is kept"
+    assert output.find('new EJS({name: "dynamic.html", precompiled: function(') != -1, "the fragment is registered precompiled"
+    assert output[len(DYNAMIC):].find("</li>") == -1, "closing tags are escaped in the registration script"
+    assert prerenderer.prerender("dynamic.html", DYNAMIC) is output, "unchanged fragments are compiled once"
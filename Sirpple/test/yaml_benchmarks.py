@@ -0,0 +1,115 @@
+""" Benchmarks for parsing the YAML configuration files with the bundled pyyaml """
+
+import glob
+import StringIO
+import sys
+import time
+
+import configparser
+import pyyaml
+
+CONFIG_GLOB = "configuration/*/*.yaml"
+
+def __read_configs(copies):
+    sources = []
+    for filename in glob.glob(CONFIG_GLOB):
+        with open(filename) as f:
+            sources.append(f.read())
+    return sources * copies
+
+def __generate_schema(num_classes, num_fields):
+    lines = []
+    for i in range(0, num_classes):
+        lines.append("Model%d: # Generated model %d" % (i, i))
+        for j in range(0, num_fields):
+            lines.append("    field%d: String # Generated field" % j)
+        lines.append("    parent: Model%d" % max(i - 1, 0))
+        lines.append("")
+    return "\n".join(lines)
+
+def __node_graph_size(root):
+    # Adds up the nodes, their marks and any per-instance dictionaries
+    total = 0
+    seen = set()
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        for item in (node, node.start_mark, node.end_mark):
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            total += sys.getsizeof(item)
+            if hasattr(item, "__dict__"):
+                total += sys.getsizeof(item.__dict__)
+
+        if isinstance(node.value, list):
+            for child in node.value:
+                if isinstance(child, tuple):
+                    pending.extend(child)
+                else:
+                    pending.append(child)
+    return total, len(seen)
+
+def __best_time(runs, fn):
+    best = None
+    for i in range(0, runs):
+        start = time.time()
+        fn()
+        elapsed = time.time() - start
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+def compare_token_throughput(runs="10", copies="20"):
+    sources = __read_configs(int(copies))
+    num_tokens = sum(map(lambda x: len(list(pyyaml.scan(x))), sources))
+
+    # Streams are read in chunks so they take the per-character scanner path
+    def streamed():
+        for source in sources:
+            list(pyyaml.scan(StringIO.StringIO(source)))
+
+    def in_memory():
+        for source in sources:
+            list(pyyaml.scan(source))
+
+    streamed_time = __best_time(int(runs), streamed)
+    in_memory_time = __best_time(int(runs), in_memory)
+
+    print "%d tokens per run" % num_tokens
+    print "Per character: %.0f tokens/s" % (num_tokens / streamed_time)
+    print "Bulk scanning: %.0f tokens/s" % (num_tokens / in_memory_time)
+    print "Speedup:       %.1fx" % (streamed_time / in_memory_time)
+
+def compare_node_memory(classes="500", fields="10"):
+    source = __generate_schema(int(classes), int(fields))
+
+    # Streams get marks with line and column filled in, strings get lazy marks
+    streamed_size, num_objects = __node_graph_size(pyyaml.compose(StringIO.StringIO(source)))
+    in_memory_size, num_objects = __node_graph_size(pyyaml.compose(source))
+
+    print "%d bytes of YAML, %d nodes and marks" % (len(source), num_objects)
+    print "Eager marks: %.1f KB" % (streamed_size / 1024.0)
+    print "Lazy marks:  %.1f KB" % (in_memory_size / 1024.0)
+
+def compare_config_loaders(runs="10", copies="20"):
+    sources = __read_configs(int(copies))
+
+    def loader_time(loader):
+        def load_all():
+            for source in sources:
+                pyyaml.load(source, Loader=loader)
+        return __best_time(int(runs), load_all)
+
+    # The full loader is what configuration files were read with before
+    full_time = loader_time(pyyaml.Loader)
+    trimmed_time = loader_time(configparser.ConfigLoader)
+
+    print "%d documents per run" % len(sources)
+    print "Full loader:    %.1f ms" % (full_time * 1000)
+    print "Trimmed loader: %.1f ms (%.1fx)" % (trimmed_time * 1000, full_time / trimmed_time)
+    if configparser.CConfigLoader != None:
+        c_time = loader_time(configparser.CConfigLoader)
+        print "libyaml loader: %.1f ms (%.1fx)" % (c_time * 1000, full_time / c_time)
+    else:
+        print "libyaml loader: unavailable, the yaml package is missing or built without libyaml"
@@ -0,0 +1,213 @@
+""" Tests checking the in-memory fast paths of the bundled pyyaml against its stream paths """
+
+import glob
+import random
+import StringIO
+
+import configparser
+import pyyaml
+from pyyaml.constructor import SafeConstructor
+from pyyaml.error import Mark
+from pyyaml.nodes import ScalarNode
+from pyyaml.resolver import Resolver
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+CONFIG_GLOB = "configuration/*/*.yaml"
+
+SAMPLE = (u"# Sample\nProject:\n    name: \"Demo\" # comment\n    worlds: [one, two, 3]\n"
+    u"    flags: {visible: yes, ratio: 0.5, empty: ~}\n    notes: |\n        line one\n        line two\n"
+    u"    folded: >\n        folded\n        text\n    plain: a value\n        continued here\n"
+    u"    anchor: &base {x: 1}\n    merged:\n        <<: *base\n        y: 2\n---\n- 2001-12-14\n- '12:30:45'\n- -1_000\n")
+
+# Documents that fail at different points of the pipeline
+INVALID = [
+    "a: [1, 2",
+    "a: b: c",
+    "- a\nb: c",
+    "{a: 1",
+    "key: 'unterminated",
+    "\tfoo: bar",
+    "a:\n  - b\n c: d",
+    "a: 1\n- b",
+    "a: *missing",
+    "a: !!set [x]",
+    "a: !!python/none ''",
+    "%YAML 2.0\n--- a",
+    "a: \"bad \\q escape\"",
+    "a: |0\n b"
+]
+
+SCALAR_PIECES = ["0", "1", "7", "9", "-", "+", ".", "e", "E", "_", ":", "x", "o", "b", "a", "f",
+    "yes", "No", "ON", "off", "true", "False", "~", "null", "Null", ".inf", ".NaN", "0x1F", "0o17",
+    "0b101", "1_000", "2001-12-14", "12:30:45", "T", " ", "Z", "<<", "=", "~x", "-.5"]
+
+class UncachedLoader(pyyaml.SafeLoader):
+    """ Loader that never reuses constructed scalars """
+
+    yaml_constructors = SafeConstructor.yaml_constructors.copy()
+    yaml_cacheable_constructors = set()
+
+def __get_documents():
+    documents = []
+    for filename in glob.glob(CONFIG_GLOB):
+        with open(filename) as f:
+            documents.append(f.read())
+
+    # Every kind of line break, with and without a byte order mark
+    for line_break in (u"\n", u"\r\n", u"\r", u"\x85", u"\u2028"):
+        documents.append(SAMPLE.replace(u"\n", line_break))
+    documents.append(SAMPLE.encode("utf-8"))
+    documents.append("\xef\xbb\xbf" + SAMPLE.encode("utf-8"))
+    documents.append(SAMPLE.encode("utf-16"))
+    documents.append(u"a: b\n\ufeffc: d\n")
+
+    return documents + INVALID
+
+def __get_scalars(count):
+    generator = random.Random(20)
+    scalars = []
+    for i in range(0, count):
+        pieces = generator.sample(SCALAR_PIECES, generator.randint(1, 4))
+        scalars.append("".join(pieces).strip())
+    return scalars
+
+def __get_plain_scalars(count):
+    # Only those that can be written as a plain scalar in a block sequence and constructed
+    scalars = []
+    for scalar in __get_scalars(count):
+        try:
+            node = pyyaml.compose("- " + scalar)
+            pyyaml.load("- " + scalar, Loader=UncachedLoader)
+        except (pyyaml.YAMLError, ValueError):
+            continue
+        if len(node.value) == 1 and isinstance(node.value[0], ScalarNode):
+            scalars.append(scalar)
+    return scalars
+
+def __describe_mark(mark):
+    if mark == None:
+        return None
+    return (mark.index, mark.line, mark.column)
+
+def __describe_error(error):
+    return (error.__class__.__name__, getattr(error, "problem", None), getattr(error, "context", None),
+        __describe_mark(getattr(error, "problem_mark", None)), __describe_mark(getattr(error, "context_mark", None)))
+
+def __describe_item(item):
+    attributes = []
+    for cls in item.__class__.__mro__:
+        attributes.extend(getattr(cls, "__slots__", ()))
+    values = [getattr(item, key) for key in sorted(attributes) if not key.endswith("_mark")]
+    return (item.__class__.__name__, values, __describe_mark(item.start_mark), __describe_mark(item.end_mark))
+
+def __describe_all(fn, source):
+    # Everything produced before an error, then the error
+    items = []
+    try:
+        for item in fn(source):
+            items.append(__describe_item(item))
+    except pyyaml.YAMLError, e:
+        items.append(__describe_error(e))
+    return items
+
+def __stream(source):
+    return StringIO.StringIO(source)
+
+def check_tokens_match_stream():
+    for source in __get_documents():
+        expected = __describe_all(lambda x: pyyaml.scan(__stream(x)), source)
+        actual = __describe_all(pyyaml.scan, source)
+        assert actual == expected, "tokens of %r match the stream path" % source
+
+def check_events_match_stream():
+    for source in __get_documents():
+        expected = __describe_all(lambda x: pyyaml.parse(__stream(x)), source)
+        actual = __describe_all(pyyaml.parse, source)
+        assert actual == expected, "events of %r match the stream path" % source
+
+def check_lazy_marks():
+    for source in __get_documents():
+        try:
+            tokens = list(pyyaml.scan(source))
+        except pyyaml.YAMLError:
+            continue
+
+        for token in tokens:
+            for mark in (token.start_mark, token.end_mark):
+                eager = Mark(mark.name, mark.index, mark.line, mark.column, mark.buffer, mark.pointer)
+                assert str(mark) == str(eager), "lazy mark %s formats like an eager one" % eager
+
+def check_errors_match_stream():
+    for source in INVALID:
+        expected = None
+        try:
+            pyyaml.safe_load(__stream(source))
+        except pyyaml.YAMLError, e:
+            expected = __describe_error(e)
+
+        actual = None
+        try:
+            pyyaml.safe_load(source)
+        except pyyaml.YAMLError, e:
+            actual = __describe_error(e)
+
+        assert expected != None, "%r is invalid" % source
+        assert actual == expected, "error for %r matches the stream path" % source
+
+def check_implicit_resolution(count="5000"):
+    resolver = Resolver()
+    resolvers = Resolver.yaml_implicit_resolvers
+
+    for value in map(unicode, __get_scalars(int(count))):
+
+        # Each resolver for the first character in order, then those for any character
+        expected = Resolver.DEFAULT_SCALAR_TAG
+        for tag, regexp in resolvers.get(value[:1], []) + resolvers.get(None, []):
+            if regexp.match(value):
+                expected = tag
+                break
+
+        assert resolver.resolve(ScalarNode, value, (True, False)) == expected, "%r resolves to %s" % (value, expected)
+
+def check_scalar_cache(count="5000"):
+    sources = __get_documents()[:-len(INVALID)]
+    sources.append("\n".join(map(lambda x: "- " + x, __get_plain_scalars(int(count)))))
+
+    for source in sources:
+        expected = list(pyyaml.load_all(source, Loader=UncachedLoader))
+        first = list(pyyaml.safe_load_all(source))
+        second = list(pyyaml.safe_load_all(source))
+
+        assert first == expected, "cached load of %r matches an uncached load" % source[:40]
+        assert second == expected, "second cached load of %r matches an uncached load" % source[:40]
+
+        for document, other in zip(first, second):
+            if isinstance(document, (list, dict)):
+                assert not document is other, "loads do not share containers"
+
+def check_config_loaders_match():
+    if configparser.CConfigLoader == None:
+        return
+
+    # libyaml rejects byte order marks inside a document, so only compare whole documents
+    sources = [SAMPLE, SAMPLE.encode("utf-8"), u"a: !!python/none ''", u"a: 2001-12-14"]
+    for filename in glob.glob(CONFIG_GLOB):
+        with open(filename) as f:
+            sources.append(f.read())
+
+    for source in sources:
+        try:
+            expected = pyyaml.load(source, Loader=configparser.ConfigLoader)
+        except pyyaml.YAMLError, e:
+            expected = e.__class__.__name__
+
+        try:
+            actual = pyyaml.load(source, Loader=configparser.CConfigLoader)
+        except yaml.YAMLError, e:
+            actual = e.__class__.__name__
+
+        assert actual == expected, "libyaml config loader matches the pure Python one for %r" % source[:40]
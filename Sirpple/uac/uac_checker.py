@@ -2,6 +2,22 @@
 Module containing logic to check that a user is authorized to view / edit an entity
 """
 
+import collections
+import threading
+import time
+
+from serialization import adapted_models
+
+try:
+    from google.appengine.api import memcache
+    from google.appengine.ext import db
+    from google.appengine.ext.db import Query
+except ImportError:
+    # dont fail for on-the-ground testing
+    memcache = None
+    db = None
+    Query = None
+
 # TODO: Factory currently sitting serialization.backends
 
 class UACChecker:
@@ -11,6 +27,14 @@ class UACChecker:
     
     def __init__(self):
         pass
+
+    def start_request(self):
+        """ Called before a request is handled so per-request state can be reset """
+        pass
+
+    def end_request(self):
+        """ Called once a request has been handled """
+        pass
     
     def is_authorized(self, target, user):
         """
@@ -22,6 +46,19 @@ class UACChecker:
         @type user: The backend-specific user representation
         """
         raise NotImplementedError("Must use implmentor of this interface")
+
+    def is_authorized_many(self, targets, user):
+        """
+        Determines which of the given targets the user has read / write access to
+
+        @param targets: The models that the user wants to access
+        @type targets: List of instances of the subclass of AdaptedModel currently in use
+        @param user: The user that wishes to access the model instances in question
+        @type user: The backend-specific user representation
+        @return: Mask with True for each target the user may access and False otherwise
+        @rtype: List of Booleans
+        """
+        return map(lambda x: self.is_authorized(x, user), targets)
     
 class GAEUACChecker(UACChecker):
     """
@@ -43,6 +80,347 @@ class GAEUACChecker(UACChecker):
         
         return GAEUACChecker.__instance
     
+    # Only members of a project may access it. Projects without any Membership,
+    # including new ones and those created before memberships existed, are
+    # claimed by the first signed in user that accesses them.
+    ENFORCE_MEMBERSHIP = True
+
+    PROJECT_MODEL_NAME = "Project"
+    MEMBERSHIP_MODEL_NAME = "Membership"
+    MEMBERSHIP_USER_FIELD = "user"
+
+    MEMBERSHIP_CACHE_PREFIX = "memberships:"
+    MEMBERSHIP_GENERATION_KEY = "memberships_generation"
+    MEMBERSHIP_CACHE_TTL = 600
+
+    # Memberships written by other instances may take this long to be seen locally
+    LOCAL_MEMBERSHIP_TTL = 30
+    MAX_LOCAL_USERS = 500
+    MAX_LOCAL_CLAIMED_PROJECTS = 5000
+
+    def __init__(self):
+        """
+        Constructor for GAEUACChecker
+
+        @note: This is a singleton and this should not be called externally
+        """
+        UACChecker.__init__(self)
+        self.__local_memberships = collections.OrderedDict()
+        self.__local_generation = 0
+        self.__claimed_projects = set()
+        self.__lock = threading.Lock()
+        self.__request = threading.local()
+        self.reset_membership_stats()
+
+    def start_request(self):
+        """ Has the next membership lookup read the shared generation again """
+        self.__request.generation_checked = False
+        self.__request.active = True
+
+    def end_request(self):
+        """ Goes back to reading the shared generation on every membership lookup """
+        self.__request.generation_checked = False
+        self.__request.active = False
+
     def is_authorized(self, target, user):
-        return True # TODO: After authentication, this ought to be filled in
-        # NOTE: user or target might be null
\ No newline at end of file
+        return self.is_authorized_many([target], user)[0]
+
+    def is_authorized_many(self, targets, user):
+        if not GAEUACChecker.ENFORCE_MEMBERSHIP:
+            return [True] * len(targets)
+
+        # NOTE: user or target might be null
+        if user == None:
+            return [False] * len(targets)
+
+        # Group targets by the project that owns them
+        project_keys = self.get_project_keys(targets)
+        authorized_projects = self.get_authorized_project_keys(user)
+
+        # Projects nobody is a member of yet go to this user
+        unknown = set(filter(lambda x: x != None and not str(x) in authorized_projects, project_keys))
+        if unknown:
+            authorized_projects = authorized_projects | self.__claim_projects(unknown, user)
+
+        mask = []
+        for target, project_key in zip(targets, project_keys):
+            if project_key == None:
+                mask.append(self.__is_new_project(target))
+            else:
+                mask.append(str(project_key) in authorized_projects)
+
+        return mask
+
+    def get_authorized_project_keys(self, user):
+        """
+        Determines every project the given user is a member of
+
+        Reads through an in-process LRU and then memcache before querying
+        Membership entities. Entries in both are stamped with the generation
+        shared through memcache, which is read once per request.
+
+        @param user: The user to look up projects for
+        @type user: users.User
+        @return: Encoded keys of the projects the user may access
+        @rtype: frozenset of Strings
+        """
+        user_id = user.user_id() or user.email()
+        cache_key = GAEUACChecker.MEMBERSHIP_CACHE_PREFIX + user_id
+        cached = None
+
+        # Pick up Membership writes made on other instances once per request
+        if not getattr(self.__request, "generation_checked", False):
+            cached = memcache.get_multi([cache_key, GAEUACChecker.MEMBERSHIP_GENERATION_KEY])
+            self.__set_generation(cached.get(GAEUACChecker.MEMBERSHIP_GENERATION_KEY, None))
+
+        # In-process cache
+        with self.__lock:
+            generation = self.__local_generation
+            entry = self.__local_memberships.pop(user_id, None)
+            if entry != None and entry[0] == generation and entry[1] > time.time():
+                self.__local_memberships[user_id] = entry
+                self.__local_hits += 1
+                return entry[2]
+
+        # Memcache, only valid if no Membership was written since it was stored
+        if cached == None:
+            cached = memcache.get_multi([cache_key])
+        entry = cached.get(cache_key, None)
+
+        if entry != None and entry[0] == generation:
+            self.__memcache_hits += 1
+            project_keys = entry[1]
+        else:
+            self.__misses += 1
+            project_keys = self.__load_authorized_project_keys(user)
+            memcache.set(cache_key, (generation, project_keys), time=GAEUACChecker.MEMBERSHIP_CACHE_TTL)
+
+        self.__remember_locally(user_id, generation, project_keys)
+        return project_keys
+
+    def __set_generation(self, generation):
+        """
+        Moves to the generation shared by every instance, dropping local entries if it changed
+
+        @param generation: The shared generation read from memcache or None if missing
+        @type generation: int
+        """
+        # Start evicted generations from the time so an earlier value is not repeated
+        if generation == None:
+            generation = int(time.time() * 1000)
+            if not memcache.add(GAEUACChecker.MEMBERSHIP_GENERATION_KEY, generation):
+                generation = memcache.get(GAEUACChecker.MEMBERSHIP_GENERATION_KEY) or generation
+
+        with self.__lock:
+            if generation != self.__local_generation:
+                self.__local_generation = generation
+                self.__local_memberships.clear()
+
+        if getattr(self.__request, "active", False):
+            self.__request.generation_checked = True
+
+    def __is_new_project(self, target):
+        """
+        Determines if target is a project that is being created
+
+        @param target: The model that the user wants to access
+        @type target: Any instance of the subclass of AdaptedModel currently in use
+        @return: True if target is an unsaved project and False otherwise
+        @rtype: Boolean
+        """
+        if target == None or target.is_saved() or target.parent_key() != None:
+            return False
+        return target.kind() == GAEUACChecker.PROJECT_MODEL_NAME
+
+    def __claim_projects(self, project_keys, user):
+        """
+        Makes user the first member of each of the given projects that has no members
+
+        @note: Writes a Membership for each claimed project. Projects found to have
+               members or to not exist are remembered so they are only queried once
+               per instance.
+        @param project_keys: Keys of projects user is not a member of
+        @type project_keys: Set of Keys
+        @param user: The user to add
+        @type user: users.User
+        @return: Encoded keys of the projects user became a member of
+        @rtype: frozenset of Strings
+        """
+        # TODO: This is messy, avoids a circular import through backends
+        from serialization import config_model
+
+        membership_class = config_model.ConfigModelFactory.get_instance().get_model(GAEUACChecker.MEMBERSHIP_MODEL_NAME)
+
+        def claim(project_key):
+            if db.get(project_key) == None:
+                return None
+            if Query(membership_class, keys_only=True).ancestor(project_key).get() != None:
+                return None
+            return db.put(membership_class(parent=project_key, user=user))
+
+        with self.__lock:
+            project_keys = filter(lambda x: not str(x) in self.__claimed_projects, project_keys)
+
+        membership_keys = []
+        for project_key in project_keys:
+            membership_key = db.run_in_transaction(claim, project_key)
+            if membership_key != None:
+                membership_keys.append(membership_key)
+
+        with self.__lock:
+            if len(self.__claimed_projects) > GAEUACChecker.MAX_LOCAL_CLAIMED_PROJECTS:
+                self.__claimed_projects.clear()
+            self.__claimed_projects.update(map(str, project_keys))
+
+        # Clears cached copies and, through the write listener, every membership index
+        if membership_keys:
+            adapted_models.GAEAdaptedModel.invalidate_cache(membership_keys)
+
+        return frozenset(map(lambda x: str(x.parent()), membership_keys))
+
+    def invalidate_memberships(self, keys=None):
+        """
+        Invalidates every cached membership index after Membership entities change
+
+        @keyword keys: Keys of the Membership entities that changed. Unused, every
+                       user is invalidated. Defaults to None.
+        @type keys: List of Keys
+        """
+        generation = memcache.incr(GAEUACChecker.MEMBERSHIP_GENERATION_KEY, initial_value=int(time.time() * 1000))
+
+        with self.__lock:
+            self.__local_memberships.clear()
+            if generation != None:
+                self.__local_generation = generation
+
+        # Read the generation again if the increment failed
+        if generation == None:
+            self.__request.generation_checked = False
+
+    def get_membership_stats(self):
+        """
+        Gets counters describing how well the membership cache is performing
+
+        @return: Counts of in-process hits, memcache hits and misses
+        @rtype: Dictionary from String to int
+        """
+        return {
+            "local_hits" : self.__local_hits,
+            "memcache_hits" : self.__memcache_hits,
+            "misses" : self.__misses
+        }
+
+    def reset_membership_stats(self):
+        """ Sets all of the membership cache counters back to zero """
+        self.__local_hits = 0
+        self.__memcache_hits = 0
+        self.__misses = 0
+
+    def __remember_locally(self, user_id, generation, project_keys):
+        """
+        Puts the projects of a user in the in-process cache, evicting the least recently used
+
+        @param user_id: The id of the user
+        @type user_id: String
+        @param generation: The shared generation read before the projects were looked up
+        @type generation: int
+        @param project_keys: Encoded keys of the projects the user may access
+        @type project_keys: frozenset of Strings
+        """
+        expires = time.time() + GAEUACChecker.LOCAL_MEMBERSHIP_TTL
+
+        with self.__lock:
+            self.__local_memberships[user_id] = (generation, expires, project_keys)
+
+            while len(self.__local_memberships) > GAEUACChecker.MAX_LOCAL_USERS:
+                self.__local_memberships.popitem(last=False)
+
+    def __load_authorized_project_keys(self, user):
+        """
+        Queries the memberships of user
+
+        @param user: The user to look up projects for
+        @type user: users.User
+        @return: Encoded keys of the projects the user may access
+        @rtype: frozenset of Strings
+        """
+        # TODO: This is messy, avoids a circular import through backends
+        from serialization import config_model
+
+        membership_class = config_model.ConfigModelFactory.get_instance().get_model(GAEUACChecker.MEMBERSHIP_MODEL_NAME)
+
+        query = Query(membership_class, keys_only=True)
+        query.filter(GAEUACChecker.MEMBERSHIP_USER_FIELD + " =", user)
+
+        project_keys = set()
+        for membership_key in query:
+            project_key = membership_key.parent()
+            if project_key != None and project_key.kind() == GAEUACChecker.PROJECT_MODEL_NAME:
+                project_keys.add(str(project_key))
+
+        return frozenset(project_keys)
+
+    def get_project_keys(self, targets):
+        """
+        Determines the key of the project that owns each target
+
+        Read from the entity key path without touching the datastore. The
+        parent of every model is the parent in its key, so targets whose key
+        path does not lead to a project are not owned by one.
+
+        @param targets: The models to find the owning projects for
+        @type targets: List of instances of the subclass of AdaptedModel currently in use
+        @return: Key of the owning project for each target or None if not under a project
+        @rtype: List of Keys
+        """
+        project_keys = []
+        for target in targets:
+            if target == None:
+                project_keys.append(None)
+            else:
+                project_keys.append(self.__get_path_project_key(target))
+
+        return project_keys
+
+    def __get_path_project_key(self, target):
+        """
+        Determines the key of the project that owns target from its key path
+
+        @param target: The model to find the owning project for
+        @type target: Any instance of the subclass of AdaptedModel currently in use
+        @return: Key of the owning project or None if the key path has no project
+        @rtype: Key
+        """
+        if target.is_saved():
+            return self.__get_root_project_key(target.key())
+
+        # Not yet saved instances still know where they will be saved
+        parent_key = target.parent_key()
+        if parent_key == None:
+            return None
+
+        return self.__get_root_project_key(parent_key)
+
+    def __get_root_project_key(self, key):
+        """
+        Gets the root of the given key path if it is a project
+
+        @param key: The key to find the root of
+        @type key: Key
+        @return: Key of the project at the root of the path or None
+        @rtype: Key
+        """
+        # Projects are the root of every entity group they own
+        while key.parent() != None:
+            key = key.parent()
+
+        if key.kind() != GAEUACChecker.PROJECT_MODEL_NAME:
+            return None
+
+        return key
+
+def _invalidate_memberships(keys):
+    GAEUACChecker.get_instance().invalidate_memberships(keys)
+
+# Registered on import so every instance bumps the shared generation on writes
+adapted_models.GAEAdaptedModel.add_write_listener(GAEUACChecker.MEMBERSHIP_MODEL_NAME, _invalidate_memberships)
@@ -21,3 +21,18 @@ def load(language = "yaml", location = 'app_config.yaml'):
     globals().update(models)
     
     return models
+
+def build_snapshot(language = "yaml", location = 'app_config.yaml'):
+
+    # Parse the config files and save them for instances to load at cold start
+    mechanic = loaders.ConfigModelFactoryMechanic.get_instance()
+
+    with open(location) as config_file:
+        configuration = config_file.read()
+
+    return mechanic.build_snapshot(language, configuration)
+
+if __name__ == "__main__":
+
+    # Run from the app root before deploying: python yamlmodels.py
+    print "Wrote schema snapshot to " + build_snapshot()